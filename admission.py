@@ -0,0 +1,117 @@
+"""
+Admission control for the expensive endpoints.
+
+Each AdmissionGate allows a fixed number of requests to run at once and
+queues a bounded number more. Requests that find the queue full, or that
+wait longer than ADMISSION_QUEUE_TIMEOUT, are shed with a fast 503 and a
+Retry-After header. Once the queue is deeper than the gate's degrade
+depth, newly admitted requests run in degraded mode (g.degraded), which
+/calculate uses to skip the LLM and serve rule-based advice.
+
+Limits are per worker process; with several workers the host-wide limit
+is the per-worker limit times the worker count.
+"""
+import functools
+import logging
+import os
+import threading
+
+from flask import g, render_template
+
+# Admission control configuration
+CALCULATE_MAX_CONCURRENCY = int(os.getenv('CALCULATE_MAX_CONCURRENCY', '8'))
+CALCULATE_MAX_QUEUE = int(os.getenv('CALCULATE_MAX_QUEUE', '32'))
+CALCULATE_DEGRADE_DEPTH = int(os.getenv('CALCULATE_DEGRADE_DEPTH', '4'))
+FORM_MAX_CONCURRENCY = int(os.getenv('FORM_MAX_CONCURRENCY', str(os.cpu_count() or 2)))
+FORM_MAX_QUEUE = int(os.getenv('FORM_MAX_QUEUE', '16'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '5'))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '5'))
+
+logger = logging.getLogger(__name__)
+
+class AdmissionGate:
+    """Concurrency limit plus bounded wait queue for one endpoint"""
+
+    def __init__(self, name, max_concurrency, max_queue, degrade_depth=None,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT, retry_after=ADMISSION_RETRY_AFTER):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.degrade_depth = degrade_depth
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.counters = {'admitted': 0, 'degraded': 0, 'shed_queue_full': 0, 'shed_timeout': 0}
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait for a slot. Returns (admitted, degraded); a request that isn't
+        admitted must not call release().
+        """
+        # Fast path: a free slot means no queueing and no degradation
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+                self.counters['admitted'] += 1
+            return True, False
+
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.counters['shed_queue_full'] += 1
+                return False, False
+            self.waiting += 1
+            degraded = self.degrade_depth is not None and self.waiting > self.degrade_depth
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.counters['shed_timeout'] += 1
+                return False, False
+            self.active += 1
+            self.counters['admitted'] += 1
+            if degraded:
+                self.counters['degraded'] += 1
+        return True, degraded
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def reject(self):
+        """Fast 503 for a shed request"""
+        logger.warning("Shedding %s request (%d active, %d queued)", self.name, self.active, self.waiting)
+        body = render_template('error.html', error="We're handling a lot of returns right now. "
+                               "Please try again in a few seconds.")
+        return body, 503, {'Retry-After': str(self.retry_after)}
+
+    def limit(self, view):
+        """Decorator that runs a view under this gate and sets g.degraded"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            admitted, degraded = self.acquire()
+            if not admitted:
+                return self.reject()
+            try:
+                g.degraded = degraded
+                return view(*args, **kwargs)
+            finally:
+                self.release()
+        return wrapper
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counters, active=self.active, waiting=self.waiting,
+                        max_concurrency=self.max_concurrency, max_queue=self.max_queue)
+
+calculate_gate = AdmissionGate('calculate', CALCULATE_MAX_CONCURRENCY, CALCULATE_MAX_QUEUE,
+                               degrade_depth=CALCULATE_DEGRADE_DEPTH)
+form_gate = AdmissionGate('generate_form', FORM_MAX_CONCURRENCY, FORM_MAX_QUEUE)
+
+def admission_metrics():
+    """Counters and current load for every gate"""
+    return {gate.name: gate.snapshot() for gate in (calculate_gate, form_gate)}
@@ -0,0 +1,188 @@
+"""
+Pluggable completion backends for the LLM advice path.
+
+get_llm_tax_advice talks to an advice backend instead of the OpenAI client
+directly, so load tests can run offline:
+
+- openai:    real chat completions (default when OPENAI_API_KEY is set)
+- record:    real completions, each appended to a JSONL cassette
+- replay:    completions served from a cassette with recorded latencies
+- synthetic: generated valid, malformed and prose responses with lognormal latency
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+# Advice backend configuration
+ADVICE_BACKEND = os.getenv('ADVICE_BACKEND', 'openai')
+ADVICE_CASSETTE = os.getenv('ADVICE_CASSETTE', 'advice_cassette.jsonl')
+ADVICE_REPLAY_LATENCY_SCALE = float(os.getenv('ADVICE_REPLAY_LATENCY_SCALE', '1.0'))
+ADVICE_SYNTHETIC_MALFORMED_RATE = float(os.getenv('ADVICE_SYNTHETIC_MALFORMED_RATE', '0.1'))
+ADVICE_SYNTHETIC_PROSE_RATE = float(os.getenv('ADVICE_SYNTHETIC_PROSE_RATE', '0.05'))
+ADVICE_SYNTHETIC_LATENCY = float(os.getenv('ADVICE_SYNTHETIC_LATENCY', '1.5'))
+
+logger = logging.getLogger(__name__)
+
+Completion = namedtuple('Completion', ['text', 'prompt_tokens', 'completion_tokens', 'latency'])
+
+def request_key(messages, model):
+    """Stable key for a completion request, used to match cassette entries"""
+    encoded = json.dumps({'model': model, 'messages': messages}, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+class OpenAIAdviceBackend:
+    """Real chat completions through the OpenAI client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def complete(self, messages, model, **params):
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        usage = getattr(response, 'usage', None)
+        return Completion(
+            text=response.choices[0].message.content,
+            prompt_tokens=getattr(usage, 'prompt_tokens', 0),
+            completion_tokens=getattr(usage, 'completion_tokens', 0),
+            latency=time.perf_counter() - start
+        )
+
+class RecordingAdviceBackend:
+    """Wraps another backend and appends every completion to a cassette"""
+
+    def __init__(self, inner, cassette_path=ADVICE_CASSETTE):
+        self.inner = inner
+        self.cassette_path = cassette_path
+        self._lock = threading.Lock()
+
+    def complete(self, messages, model, **params):
+        completion = self.inner.complete(messages, model, **params)
+        entry = {
+            'key': request_key(messages, model),
+            'model': model,
+            'params': params,
+            'text': completion.text,
+            'prompt_tokens': completion.prompt_tokens,
+            'completion_tokens': completion.completion_tokens,
+            'latency': completion.latency
+        }
+        with self._lock:
+            with open(self.cassette_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+        return completion
+
+class ReplayAdviceBackend:
+    """
+    Serves recorded completions. Requests seen during recording get their
+    own response; anything else gets a random recorded response. Latency is
+    drawn from the recorded latency distribution (times latency_scale).
+    """
+
+    def __init__(self, cassette_path=ADVICE_CASSETTE, latency_scale=ADVICE_REPLAY_LATENCY_SCALE, seed=None):
+        with open(cassette_path, encoding='utf-8') as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+        if not self.entries:
+            raise ValueError(f"Cassette {cassette_path} has no recorded completions")
+        self.by_key = {}
+        for entry in self.entries:
+            self.by_key.setdefault(entry['key'], []).append(entry)
+        self.latencies = [entry['latency'] for entry in self.entries]
+        self.latency_scale = latency_scale
+        self._random = random.Random(seed)
+
+    def complete(self, messages, model, **params):
+        matches = self.by_key.get(request_key(messages, model)) or self.entries
+        entry = self._random.choice(matches)
+        latency = self._random.choice(self.latencies) * self.latency_scale
+        time.sleep(latency)
+        return Completion(entry['text'], entry['prompt_tokens'], entry['completion_tokens'], latency)
+
+class SyntheticAdviceBackend:
+    """
+    Generates advice without any API: mostly valid JSON, plus malformed JSON
+    and plain prose at configurable rates, to exercise format_llm_advice and
+    the parse_text_advice fallback.
+    """
+
+    OPPORTUNITIES = [
+        ('Charitable Contributions', 'Bunch charitable giving into one year to exceed the standard deduction.'),
+        ('State and Local Taxes', 'Deduct up to $10,000 of state income and property taxes.'),
+        ('Mortgage Interest', 'Deduct interest on up to $750,000 of mortgage debt.'),
+        ('Retirement Contributions', 'Contribute to a traditional IRA or 401(k) to reduce taxable income.'),
+        ('Medical Expenses', 'Medical costs above 7.5% of AGI are deductible.'),
+        ('Student Loan Interest', 'Deduct up to $2,500 of student loan interest.')
+    ]
+    TIPS = [
+        ('Track Receipts', 'Keep records for every deductible expense.', 'high'),
+        ('Year-End Timing', 'Prepay deductible expenses before December 31.', 'medium'),
+        ('Review Withholding', 'Adjust your W-4 to avoid a large balance due.', 'medium')
+    ]
+
+    def __init__(self, malformed_rate=ADVICE_SYNTHETIC_MALFORMED_RATE, prose_rate=ADVICE_SYNTHETIC_PROSE_RATE,
+                 median_latency=ADVICE_SYNTHETIC_LATENCY, latency_sigma=0.35, seed=None):
+        self.malformed_rate = malformed_rate
+        self.prose_rate = prose_rate
+        self.median_latency = median_latency
+        self.latency_sigma = latency_sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _advice(self, rng):
+        return {
+            'strategy': rng.choice(['standard', 'itemize']),
+            'missed_opportunities': [
+                {'title': title, 'description': description}
+                for title, description in rng.sample(self.OPPORTUNITIES, rng.randint(3, 4))
+            ],
+            'optimization_tips': [
+                {'title': title, 'description': description, 'priority': priority}
+                for title, description, priority in rng.sample(self.TIPS, rng.randint(2, 3))
+            ],
+            'specific_advice': 'Compare itemized and standard deductions each year as your situation changes.'
+        }
+
+    def complete(self, messages, model, **params):
+        with self._lock:
+            rng = random.Random(self._random.random())
+        schema = (params.get('response_format') or {}).get('json_schema', {}).get('schema', {})
+        if 'filers' in schema.get('properties', {}):
+            # Batched request: the prompt's first line is the JSON list of filers
+            filers = json.loads(messages[-1]['content'].split('\n', 1)[0])
+            text = json.dumps({'filers': [dict(self._advice(rng), id=filer['id']) for filer in filers]}, indent=2)
+        else:
+            filers = [None]
+            text = json.dumps(self._advice(rng), indent=2)
+        # A JSON-schema response_format guarantees well-formed output, as with the real API
+        roll = 1.0 if params.get('response_format') else rng.random()
+        if roll < self.malformed_rate:
+            # Typical failures: markdown fences or truncation at the token limit
+            text = f"```json\n{text}\n```" if rng.random() < 0.5 else text[:rng.randint(20, len(text) - 1)]
+        elif roll < self.malformed_rate + self.prose_rate:
+            text = 'You should ' + ' '.join(description.lower() for _, description in self.OPPORTUNITIES[:3])
+
+        # A quarter of the latency is fixed overhead, the rest scales with the filers generated
+        latency = rng.lognormvariate(0, self.latency_sigma) * self.median_latency * (0.25 + 0.75 * len(filers))
+        time.sleep(latency)
+        prompt_tokens = sum(len(message['content']) for message in messages) // 4
+        return Completion(text, prompt_tokens, len(text) // 4, latency)
+
+def create_advice_backend(openai_client, mode=ADVICE_BACKEND):
+    """Build the configured advice backend, or None when advice is unavailable"""
+    try:
+        if mode == 'synthetic':
+            return SyntheticAdviceBackend()
+        if mode == 'replay':
+            return ReplayAdviceBackend()
+        if openai_client is None:
+            return None
+        if mode == 'record':
+            return RecordingAdviceBackend(OpenAIAdviceBackend(openai_client))
+        return OpenAIAdviceBackend(openai_client)
+    except (OSError, ValueError) as e:
+        logger.warning("Failed to create %s advice backend: %s", mode, e)
+        return None
@@ -0,0 +1,260 @@
+"""
+Batched LLM advice for bulk processing.
+
+generate_batch_advice packs the anonymized tax contexts of many filers into
+one structured-output request per ADVICE_BATCH_SIZE unique contexts, so the
+system prompt and instructions are paid once per batch instead of once per
+filer. Identical contexts are requested once, batches run on up to
+ADVICE_BATCH_CONCURRENCY threads, and the response is split back out per
+filer and cached under the key the single-filer structured mode uses.
+
+Very large runs can go through the OpenAI Batch API instead:
+
+    python advice_batch.py prepare records.json batch.jsonl
+    python advice_batch.py submit batch.jsonl
+    python advice_batch.py fetch <batch_id> batch.jsonl
+
+fetch stores each filer's advice in the shared cache (SHARED_CACHE_PATH),
+where calculate_tax and bulk jobs pick it up until SHARED_CACHE_TTL expires.
+"""
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import tax_calculator
+from shared_cache import get_shared_cache
+from tax_calculator import (
+    ADVICE_OPPORTUNITIES, ADVICE_SCHEMA, ADVICE_TIPS, LLM_STRUCTURED_MODEL, STANDARD_DEDUCTIONS_2025,
+    STRUCTURED_SYSTEM_PROMPT, advice_cache_key, advice_token_budget, build_tax_context,
+    compact_advice_facts, parse_llm_advice, record_llm_usage, validate_input
+)
+
+# Batch advice configuration
+ADVICE_BATCH_SIZE = int(os.getenv('ADVICE_BATCH_SIZE', '20'))
+ADVICE_BATCH_CONCURRENCY = int(os.getenv('ADVICE_BATCH_CONCURRENCY', '4'))
+
+BATCH_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'filers': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': dict(ADVICE_SCHEMA['properties'], id={'type': 'integer'}),
+                'required': ['id'] + ADVICE_SCHEMA['required'],
+                'additionalProperties': False
+            }
+        }
+    },
+    'required': ['filers'],
+    'additionalProperties': False
+}
+
+logger = logging.getLogger(__name__)
+
+def filer_context(income, status, itemized_deductions):
+    """Anonymized tax context for a filer and the advice cache key it maps to"""
+    tax_context = build_tax_context(income, status, itemized_deductions, STANDARD_DEDUCTIONS_2025[status])
+    key = advice_cache_key(dict(tax_context, model=LLM_STRUCTURED_MODEL, structured=True))
+    return tax_context, key
+
+def build_batch_request(tax_contexts):
+    """Model, messages and completion parameters for one request covering several contexts"""
+    facts = [dict(compact_advice_facts(tax_context), id=i) for i, tax_context in enumerate(tax_contexts)]
+    prompt = (f"{json.dumps(facts, separators=(',', ':'))}\n"
+              f"For each filer id give {ADVICE_OPPORTUNITIES} missed deductions and {ADVICE_TIPS} tips.")
+    return LLM_STRUCTURED_MODEL, [
+        {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ], {
+        'max_tokens': 20 + len(tax_contexts) * advice_token_budget(ADVICE_OPPORTUNITIES, ADVICE_TIPS),
+        'temperature': 0.3,
+        'response_format': {
+            'type': 'json_schema',
+            'json_schema': {'name': 'tax_advice_batch', 'strict': True, 'schema': BATCH_SCHEMA}
+        }
+    }
+
+def split_batch_response(text, count):
+    """Per-context advice JSON from a batch response; None for ids the model skipped"""
+    try:
+        filers = json.loads(text)['filers']
+    except (json.JSONDecodeError, KeyError, TypeError):
+        filers = None
+    if not isinstance(filers, list):
+        record_llm_usage(parse_failures=1)
+        return [None] * count
+    advice = [None] * count
+    for filer in filers:
+        # A malformed entry only costs that entry, not the whole chunk
+        if not isinstance(filer, dict):
+            record_llm_usage(parse_failures=1)
+            continue
+        idx = filer.pop('id', None)
+        if isinstance(idx, int) and 0 <= idx < count:
+            advice[idx] = json.dumps(filer)
+    return advice
+
+def complete_batch(tax_contexts):
+    """Request advice for several contexts at once; None entries on failure"""
+    model, messages, params = build_batch_request(tax_contexts)
+    try:
+        completion = tax_calculator.advice_backend.complete(messages, model, **params)
+    except Exception as e:
+        logger.warning("Batch advice request for %d filers failed: %s", len(tax_contexts), e)
+        return [None] * len(tax_contexts)
+    record_llm_usage(completion.prompt_tokens, completion.completion_tokens)
+    return split_batch_response(completion.text, len(tax_contexts))
+
+def generate_batch_advice(filers, batch_size=ADVICE_BATCH_SIZE, concurrency=ADVICE_BATCH_CONCURRENCY):
+    """
+    Advice for a list of (income, status, itemized_deductions) filers, each
+    in the format get_llm_tax_advice returns, or None where unavailable
+    """
+    if not tax_calculator.LLM_ENABLED or tax_calculator.advice_backend is None:
+        return [None] * len(filers)
+
+    advice_cache = get_shared_cache()
+    keys = []
+    texts = {}    # cache key -> advice JSON
+    pending = {}  # cache key -> tax context still to request, deduplicated
+    for income, status, deductions in filers:
+        tax_context, key = filer_context(income, status, deductions)
+        keys.append(key)
+        if key in texts or key in pending:
+            continue
+        cached = advice_cache.get(key) if advice_cache is not None else None
+        if cached is not None:
+            texts[key] = cached.decode('utf-8')
+        else:
+            pending[key] = tax_context
+
+    pending_keys = list(pending)
+    batches = [pending_keys[start:start + batch_size] for start in range(0, len(pending_keys), batch_size)]
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            responses = pool.map(lambda batch: complete_batch([pending[key] for key in batch]), batches)
+            for batch, batch_texts in zip(batches, responses):
+                for key, text in zip(batch, batch_texts):
+                    if text is None:
+                        continue
+                    texts[key] = text
+                    if advice_cache is not None:
+                        advice_cache.set(key, text.encode('utf-8'))
+        logger.info("Batch advice: %d filers, %d unique contexts requested in %d batches",
+                    len(filers), len(pending_keys), len(batches))
+
+    return [
+        parse_llm_advice(texts[key], income, status, key) if key in texts else None
+        for key, (income, status, _) in zip(keys, filers)
+    ]
+
+def manifest_path(batch_path):
+    return batch_path + '.manifest.json'
+
+def prepare_batch_file(filers, batch_path, batch_size=ADVICE_BATCH_SIZE):
+    """
+    Write an OpenAI Batch API input file for the filers' unique contexts,
+    plus a manifest mapping each request's custom_id to its cache keys.
+    Returns the number of requests written.
+    """
+    unique = {}
+    for income, status, deductions in filers:
+        tax_context, key = filer_context(income, status, deductions)
+        unique.setdefault(key, tax_context)
+
+    keys = list(unique)
+    manifest = {}
+    with open(batch_path, 'w', encoding='utf-8') as f:
+        for number, start in enumerate(range(0, len(keys), batch_size)):
+            batch = keys[start:start + batch_size]
+            model, messages, params = build_batch_request([unique[key] for key in batch])
+            custom_id = f"advice-{number}"
+            f.write(json.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': dict(params, model=model, messages=messages)
+            }) + '\n')
+            manifest[custom_id] = batch
+    with open(manifest_path(batch_path), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return len(manifest)
+
+def import_batch_output(output_lines, batch_path):
+    """Cache every filer's advice from Batch API output lines; returns the number of contexts stored"""
+    advice_cache = get_shared_cache()
+    if advice_cache is None:
+        raise RuntimeError("Importing batch advice requires SHARED_CACHE_PATH")
+    with open(manifest_path(batch_path), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    stored = 0
+    for line in output_lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        keys = manifest.get(entry.get('custom_id'))
+        response = entry.get('response') or {}
+        if keys is None or response.get('status_code') != 200:
+            logger.warning("Skipping batch output %s: %s", entry.get('custom_id'), entry.get('error'))
+            continue
+        body = response['body']
+        usage = body.get('usage') or {}
+        record_llm_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        texts = split_batch_response(body['choices'][0]['message']['content'], len(keys))
+        for key, text in zip(keys, texts):
+            if text is not None and advice_cache.set(key, text.encode('utf-8')):
+                stored += 1
+    return stored
+
+def submit_batch_file(batch_path):
+    """Upload a prepared batch file and start the batch; returns the batch ID"""
+    client = tax_calculator.openai_client
+    if client is None:
+        raise RuntimeError("Submitting a batch requires OPENAI_API_KEY")
+    with open(batch_path, 'rb') as f:
+        input_file = client.files.create(file=f, purpose='batch')
+    batch = client.batches.create(
+        input_file_id=input_file.id, endpoint='/v1/chat/completions', completion_window='24h'
+    )
+    return batch.id
+
+def fetch_batch_results(batch_id, batch_path):
+    """Import a finished batch; returns its status and the number of contexts stored"""
+    client = tax_calculator.openai_client
+    if client is None:
+        raise RuntimeError("Fetching a batch requires OPENAI_API_KEY")
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != 'completed' or not batch.output_file_id:
+        return batch.status, 0
+    output = client.files.content(batch.output_file_id).text
+    return batch.status, import_batch_output(output.splitlines(), batch_path)
+
+def load_filers(records_path):
+    """Valid (income, status, deductions) filers from a JSON list of job records"""
+    with open(records_path, encoding='utf-8') as f:
+        records = json.load(f)
+    filers = []
+    for record in records:
+        income, deductions = str(record.get('income', '')), str(record.get('deductions', ''))
+        status, withheld = str(record.get('status', '')), str(record.get('withheld', '0'))
+        if validate_input(income, deductions, status, withheld)['valid']:
+            filers.append((float(income), status, float(deductions)))
+    return filers
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    if command == 'prepare' and len(args) == 2:
+        print(f"Wrote {prepare_batch_file(load_filers(args[0]), args[1])} requests to {args[1]}")
+    elif command == 'submit' and len(args) == 1:
+        print(submit_batch_file(args[0]))
+    elif command == 'fetch' and len(args) == 2:
+        status, stored = fetch_batch_results(args[0], args[1])
+        print(f"Batch {args[0]} is {status}; cached advice for {stored} contexts")
+    else:
+        sys.exit("Usage: advice_batch.py prepare RECORDS.json BATCH.jsonl | submit BATCH.jsonl | "
+                 "fetch BATCH_ID BATCH.jsonl")
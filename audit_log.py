@@ -0,0 +1,118 @@
+"""
+Non-blocking logging pipeline and append-only calculation audit trail.
+
+Request threads only enqueue log records and audit events; a background
+listener formats log output and the audit writer flushes JSONL in batches.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+# Audit trail configuration (disabled unless a path is set)
+AUDIT_LOG_PATH = os.getenv('AUDIT_LOG_PATH')
+AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '100'))
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+AUDIT_LOG_QUEUE_SIZE = int(os.getenv('AUDIT_LOG_QUEUE_SIZE', '10000'))
+
+_log_listener = None
+
+class RawQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records unformatted so the listener thread does all formatting.
+    QueueHandler.prepare() formats in the caller's thread and flattens the
+    record for pickling, which an in-process SimpleQueue doesn't need.
+    """
+
+    def prepare(self, record):
+        return record
+
+def setup_logging(level=logging.INFO):
+    """Route all logging through a queue drained by a background listener"""
+    global _log_listener
+    if _log_listener is not None:
+        return _log_listener
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(RawQueueHandler(log_queue))
+
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
+    return _log_listener
+
+class AuditLog:
+    """Append-only JSONL audit trail written in batches by a background thread"""
+
+    def __init__(self, path, batch_size=AUDIT_LOG_BATCH_SIZE,
+                 flush_interval=AUDIT_LOG_FLUSH_INTERVAL, max_queue=AUDIT_LOG_QUEUE_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = threading.Event()
+        self._writer = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def record(self, event):
+        """Queue an audit event; never blocks the calling request thread"""
+        event = dict(event, logged_at=time.time())
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5.0):
+        """Flush pending events and stop the writer thread"""
+        if not self._closed.is_set():
+            self._closed.set()
+            self._writer.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                pass
+
+            closing = self._closed.is_set()
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline or closing:
+                if closing:
+                    while True:
+                        try:
+                            batch.append(self._queue.get_nowait())
+                        except queue.Empty:
+                            break
+                if batch:
+                    self._write(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+                if closing:
+                    return
+
+    def _write(self, batch):
+        try:
+            lines = ''.join(json.dumps(event, default=str) + '\n' for event in batch)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        except OSError as e:
+            logging.getLogger(__name__).warning("Audit log write failed (%d events lost): %s", len(batch), e)
+
+def create_audit_log(path=AUDIT_LOG_PATH):
+    """Return the configured audit log, or None when auditing is disabled"""
+    return AuditLog(path) if path else None
@@ -0,0 +1,51 @@
+"""
+Offline load test of the advice path using the synthetic or replay backend.
+
+Usage: python benchmarks/bench_advice_load.py [requests] [concurrency]
+Set ADVICE_BACKEND=replay and ADVICE_CASSETTE=... to replay a recording;
+the default is the synthetic backend with a 0.2 s median latency.
+"""
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('ADVICE_BACKEND', 'synthetic')
+os.environ.setdefault('ADVICE_SYNTHETIC_LATENCY', '0.2')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tax_calculator import calculate_tax
+
+def one_request(i):
+    start = time.perf_counter()
+    result = calculate_tax(40000 + (i % 50) * 5000, 'single' if i % 2 else 'married', 8000 + (i % 7) * 2000, 6000)
+    analysis = result['deduction_analysis']
+    if analysis.get('ai_advice') is None:
+        outcome = 'rules'
+    elif any(opp['title'] == '🤖 AI Tax Advice' for opp in analysis['missed_opportunities']):
+        outcome = 'text'
+    else:
+        outcome = 'json'
+    return time.perf_counter() - start, outcome
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    outcomes = [outcome for _, outcome in results]
+    print(f"backend={os.environ['ADVICE_BACKEND']} requests={requests} concurrency={concurrency}")
+    print(f"throughput: {requests / elapsed:.1f} req/s")
+    print(f"latency ms: mean {statistics.mean(latencies):.0f}  p50 {latencies[len(latencies) // 2]:.0f}  "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:.0f}")
+    print(f"parsed as JSON: {outcomes.count('json')}  text fallback: {outcomes.count('text')}  "
+          f"rule-based fallback: {outcomes.count('rules')}")
+
+if __name__ == '__main__':
+    main()
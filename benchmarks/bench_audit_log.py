@@ -0,0 +1,57 @@
+"""
+Benchmark /calculate request latency with the audit trail off and on.
+
+Usage: python benchmarks/bench_audit_log.py [requests]
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import index
+from audit_log import AuditLog
+
+FORM = {'income': '85000', 'deductions': '12000', 'status': 'single', 'withheld': '9000'}
+
+def run(client, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.post('/calculate', data=FORM)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'mean': statistics.mean(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95)],
+        'p99': timings[int(len(timings) * 0.99)]
+    }
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logging.getLogger('index').setLevel(logging.WARNING)
+    client = index.app.test_client()
+    run(client, 50)  # warm-up
+
+    index.audit_log = None
+    off = run(client, requests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'audit.jsonl')
+        index.audit_log = AuditLog(path)
+        on = run(client, requests)
+        index.audit_log.close()
+        with open(path) as f:
+            written = sum(1 for _ in f)
+
+    print(f"{requests} requests per mode ({written} audit events written)")
+    print(f"{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for mode, stats in (('audit off', off), ('audit on', on)):
+        print(f"{mode:<10}{stats['mean']:>10.3f}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['p99']:>10.3f}")
+
+if __name__ == '__main__':
+    main()
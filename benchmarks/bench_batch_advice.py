@@ -0,0 +1,58 @@
+"""
+Per-filer vs. batched advice generation for a bulk run, on the synthetic backend.
+
+Usage: python benchmarks/bench_batch_advice.py [filers] [batch_size] [concurrency]
+Reports wall time, LLM calls and tokens, scaled to a thousand filers.
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('ADVICE_BACKEND', 'synthetic')
+os.environ.setdefault('ADVICE_SYNTHETIC_LATENCY', '0.05')
+os.environ.setdefault('ADVICE_SYNTHETIC_MALFORMED_RATE', '0')
+os.environ.setdefault('ADVICE_SYNTHETIC_PROSE_RATE', '0')
+os.environ.setdefault('LLM_STRUCTURED_OUTPUT', '1')  # Same compact prompt in both runs
+os.environ.pop('SHARED_CACHE_PATH', None)  # Both runs must actually call the backend
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tax_calculator import LLM_USAGE, STANDARD_DEDUCTIONS_2025, get_llm_tax_advice
+from advice_batch import generate_batch_advice
+
+def make_filers(count, seed=7):
+    rng = random.Random(seed)
+    # Deductions are often round figures (or zero), so contexts repeat across a large run
+    return [
+        (rng.randrange(25000, 300000, 1000), rng.choice(['single', 'married']),
+         rng.choice([0, 5000, 10000, 15000, 20000, 25000, 30000]))
+        for _ in range(count)
+    ]
+
+def measure(label, run, count):
+    before = dict(LLM_USAGE)
+    start = time.perf_counter()
+    advice = run()
+    elapsed = time.perf_counter() - start
+    usage = {key: LLM_USAGE[key] - before[key] for key in LLM_USAGE}
+    per_thousand = 1000 / count
+    print(f"{label:>10}: {elapsed * per_thousand:7.2f} s  calls {usage['calls'] * per_thousand:6.0f}  "
+          f"prompt tokens {usage['prompt_tokens'] * per_thousand:8.0f}  "
+          f"completion tokens {usage['completion_tokens'] * per_thousand:8.0f}  "
+          f"advised {sum(a is not None for a in advice)}/{count}")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    filers = make_filers(count)
+
+    print(f"filers={count} batch_size={batch_size} concurrency={concurrency} (per 1000 filers)")
+    measure('per-filer', lambda: [
+        get_llm_tax_advice(income, status, deductions, STANDARD_DEDUCTIONS_2025[status])
+        for income, status, deductions in filers
+    ], count)
+    measure('batched', lambda: generate_batch_advice(filers, batch_size, concurrency), count)
+
+if __name__ == '__main__':
+    main()
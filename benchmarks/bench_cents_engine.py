@@ -0,0 +1,86 @@
+"""
+Compare the float engine (compute_tax_figures) with the integer-cents engine.
+
+Usage: python benchmarks/bench_cents_engine.py [records]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+
+from tax_calculator import compute_tax_figures
+from cents_engine import parse_cents, calculate_tax_cents, calculate_tax_cents_batch, cents_to_dollars
+
+def rejects(fn, *args):
+    try:
+        fn(*args)
+    except (KeyError, ValueError):
+        return True
+    return False
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(2025)
+    rows = [
+        (f"{rng.uniform(0, 900000):.2f}", f"{rng.uniform(0, 60000):.2f}",
+         rng.choice(['single', 'married']), f"{rng.uniform(0, 90000):.2f}")
+        for _ in range(records)
+    ]
+
+    start = time.perf_counter()
+    float_results = [compute_tax_figures(float(i), s, float(d), float(w)) for i, d, s, w in rows]
+    float_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parsed = [(parse_cents(i), s, parse_cents(d), parse_cents(w)) for i, d, s, w in rows]
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cents_results = [calculate_tax_cents(*row) for row in parsed]
+    cents_time = time.perf_counter() - start
+
+    income, status, deductions, withheld = (np.array(column) for column in zip(*parsed))
+    start = time.perf_counter()
+    batch = calculate_tax_cents_batch(income, status, deductions, withheld)
+    batch_time = time.perf_counter() - start
+
+    # The float engine reports whole dollars; tax_owed_dollars must match it exactly. The only
+    # exception is a tax of exactly $x.50, where float noise (47480.4999... vs 47480.5000...1)
+    # decides the float engine's rounding while the integer engine rounds half-to-even
+    differing = [(f, c) for f, c in zip(float_results, cents_results) if f['tax_owed'] != c['tax_owed_dollars']]
+    float_ties = sum(c['tax_owed'] % 100 == 50 for _, c in differing)
+    mismatches = len(differing) - float_ties
+    # Float subtraction can leave taxable income a hair off $x.50 (19376.500000000004), which
+    # the float engine then rounds the other way; the cents figure is the exact one
+    taxable_differences = sum(
+        f['taxable_income'] != cents_to_dollars(c['taxable_income']) for f, c in zip(float_results, cents_results)
+    )
+    batch_mismatches = int(np.count_nonzero(batch['tax_owed'] != np.array([c['tax_owed'] for c in cents_results])))
+    batch_mismatches += int(np.count_nonzero(
+        batch['tax_owed_dollars'] != np.array([c['tax_owed_dollars'] for c in cents_results])
+    ))
+
+    print(f"{records} records")
+    print(f"float engine (compute_tax_figures): {float_time * 1000:9.1f} ms")
+    print(f"parse_cents (3 amounts/record):     {parse_time * 1000:9.1f} ms")
+    print(f"calculate_tax_cents (scalar):       {cents_time * 1000:9.1f} ms")
+    print(f"calculate_tax_cents_batch (int64):  {batch_time * 1000:9.1f} ms")
+    print(f"tax_owed mismatches vs float engine: {mismatches}")
+    print(f"exact $x.50 tax, float-noise ties:  {float_ties}")
+    print(f"taxable income float-error ties:    {taxable_differences}")
+    print(f"batch vs scalar mismatches:         {batch_mismatches}")
+    assert mismatches == 0, f"{mismatches} records differ from compute_tax_figures"
+    assert batch_mismatches == 0, f"{batch_mismatches} batch results differ from the scalar path"
+
+    # A bad status must be rejected by both paths, never priced as $0
+    bad_status = (np.array([10000000, 10000000]), np.array(['single', 'Single']), np.array([0, 0]))
+    assert rejects(calculate_tax_cents, 10000000, 'Single', 0), "scalar path accepted an unknown status"
+    assert rejects(calculate_tax_cents_batch, *bad_status), "batch path accepted an unknown status"
+    print("unknown status rejected by scalar and batch paths")
+
+if __name__ == '__main__':
+    main()
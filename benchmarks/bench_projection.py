@@ -0,0 +1,35 @@
+"""
+Latency of the Monte Carlo tax projection at several sample counts.
+
+Usage: python benchmarks/bench_projection.py [repeats]
+The results page runs the default PROJECTION_SAMPLES inline, so its p95
+should stay well under 100 ms.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from projection import project_tax
+
+INCOME = {'dist': 'lognormal', 'mean': 90000, 'sd': 25000}
+DEDUCTIONS = {'dist': 'uniform', 'low': 10000, 'high': 40000}
+WITHHELD = {'dist': 'normal', 'mean': 9000, 'sd': 1000}
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    for samples in (10000, 20000, 50000, 100000, 200000):
+        for status in ('single', 'married'):
+            timings = []
+            for seed in range(repeats):
+                start = time.perf_counter()
+                project_tax(INCOME, status, DEDUCTIONS, WITHHELD, threshold=1000, samples=samples, seed=seed)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"samples={samples:>6} {status:>7}: mean {statistics.mean(timings):6.2f} ms  "
+                  f"p95 {timings[int(len(timings) * 0.95)]:6.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Integer-cents fixed-point tax engine for batch workloads.
+
+Amounts are parsed straight from strings into integer cents and bracket
+rates are whole-percent numerators, so all tax math is exact integer
+arithmetic. The batch entry point runs the same math over int64 NumPy
+arrays. Results carry the exact tax in cents plus tax_owed_dollars, which
+rounds the unrounded tax straight to whole dollars so it matches
+compute_tax_figures' tax_owed (rounding the cents again would differ by $1
+wherever the cent-rounded tax lands on $x.50).
+"""
+import bisect
+import re
+
+import numpy as np
+
+from tax_calculator import TAX_BRACKETS_2025, STANDARD_DEDUCTIONS_2025
+
+# Rates are stored as numerators over RATE_DENOMINATOR (10% -> 10)
+RATE_DENOMINATOR = 100
+
+_AMOUNT_RE = re.compile(r'^\s*([+-]?)(\d*)(?:\.(\d*))?\s*$')
+
+def _compile_schedule(brackets):
+    """Lower bounds (cents), rate numerators and tax below each bound (cents * 100)"""
+    lowers, rates, bases = [], [], []
+    lower = base = 0
+    for limit, rate in brackets:
+        numerator = int(round(rate * RATE_DENOMINATOR))
+        lowers.append(lower)
+        rates.append(numerator)
+        bases.append(base)
+        if limit == float('inf'):
+            break
+        upper = int(round(limit * 100))
+        base += (upper - lower) * numerator
+        lower = upper
+    return {
+        'lowers': np.array(lowers, dtype=np.int64),
+        'rates': np.array(rates, dtype=np.int64),
+        'bases': np.array(bases, dtype=np.int64),
+        # Plain-int copies for the scalar path
+        'segments': (tuple(lowers), tuple(rates), tuple(bases))
+    }
+
+SCHEDULES_CENTS = {status: _compile_schedule(brackets) for status, brackets in TAX_BRACKETS_2025.items()}
+STANDARD_DEDUCTIONS_CENTS = {status: amount * 100 for status, amount in STANDARD_DEDUCTIONS_2025.items()}
+
+def parse_cents(amount_str):
+    """Parse a decimal amount string into integer cents without going through float"""
+    match = _AMOUNT_RE.match(amount_str or '')
+    if not match or not (match.group(2) or match.group(3)):
+        raise ValueError(f"Invalid amount: {amount_str!r}")
+    sign, whole, fraction = match.group(1), match.group(2) or '0', match.group(3) or ''
+    cents = int(whole) * 100 + int(fraction[:2].ljust(2, '0'))
+    # Round any sub-cent digits half-up
+    if fraction[2:3] >= '5':
+        cents += 1
+    return -cents if sign == '-' else cents
+
+def round_half_even(numerator, denominator):
+    """Integer division rounded half-to-even, matching Python's round()"""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = remainder * 2
+    if twice > denominator or (twice == denominator and quotient % 2 == 1):
+        quotient += 1
+    return quotient
+
+def cents_to_dollars(cents):
+    """Whole dollars, rounded half-to-even like the float engine"""
+    return round_half_even(cents, 100)
+
+def _round_half_even_array(numerator, denominator):
+    """Vectorized round_half_even over int64 arrays"""
+    quotient, remainder = np.divmod(numerator, denominator)
+    return quotient + ((2 * remainder > denominator) | ((2 * remainder == denominator) & (quotient % 2 == 1)))
+
+def calculate_tax_cents(income_cents, status, deductions_cents, withheld_cents=0):
+    """
+    Integer counterpart of compute_tax_figures; all amounts in cents
+    """
+    schedule = SCHEDULES_CENTS[status]
+    actual_deductions = max(deductions_cents, STANDARD_DEDUCTIONS_CENTS[status])
+    taxable_cents = max(0, income_cents - actual_deductions)
+
+    # Exact tax in units of 1/RATE_DENOMINATOR cent
+    lowers, rates, bases = schedule['segments']
+    index = max(0, bisect.bisect_left(lowers, taxable_cents) - 1)
+    numerator = bases[index] + (taxable_cents - lowers[index]) * rates[index]
+    tax_cents = round_half_even(numerator, RATE_DENOMINATOR)
+    refund_or_owed = withheld_cents - tax_cents
+
+    return {
+        'taxable_income': taxable_cents,
+        'tax_owed': tax_cents,
+        # Rounded once from the exact tax, like compute_tax_figures
+        'tax_owed_dollars': round_half_even(numerator, RATE_DENOMINATOR * 100),
+        'after_tax_income': income_cents - tax_cents,
+        'marginal_rate': rates[index],
+        'actual_deductions': actual_deductions,
+        'federal_withheld': withheld_cents,
+        'refund_or_owed': refund_or_owed,
+        'is_refund': refund_or_owed > 0,
+        'net_payment': abs(refund_or_owed)
+    }
+
+def calculate_tax_cents_batch(income_cents, status, deductions_cents, withheld_cents=0):
+    """
+    Vectorized calculate_tax_cents over int64 arrays.
+
+    status may be a single filing status or an array of statuses; an unknown
+    status raises ValueError. Returns a dict of int64 arrays in cents.
+    """
+    income_cents = np.asarray(income_cents, dtype=np.int64)
+    deductions_cents = np.broadcast_to(np.asarray(deductions_cents, dtype=np.int64), income_cents.shape)
+    withheld_cents = np.broadcast_to(np.asarray(withheld_cents, dtype=np.int64), income_cents.shape)
+    statuses = np.broadcast_to(np.asarray(status), income_cents.shape)
+
+    numerator = np.zeros(income_cents.shape, dtype=np.int64)
+    taxable_cents = np.zeros(income_cents.shape, dtype=np.int64)
+    marginal_rate = np.zeros(income_cents.shape, dtype=np.int64)
+
+    matched = 0
+    for filing_status, schedule in SCHEDULES_CENTS.items():
+        mask = statuses == filing_status
+        if not mask.any():
+            continue
+        matched += np.count_nonzero(mask)
+        deductions = np.maximum(deductions_cents[mask], STANDARD_DEDUCTIONS_CENTS[filing_status])
+        taxable = np.maximum(0, income_cents[mask] - deductions)
+        index = np.maximum(np.searchsorted(schedule['lowers'], taxable, side='left') - 1, 0)
+        numerator[mask] = schedule['bases'][index] + (taxable - schedule['lowers'][index]) * schedule['rates'][index]
+        taxable_cents[mask] = taxable
+        marginal_rate[mask] = schedule['rates'][index]
+    # Unmatched rows would otherwise come back as a silent $0 tax
+    if matched != statuses.size:
+        raise ValueError("Unknown filing status in batch")
+
+    tax_cents = _round_half_even_array(numerator, RATE_DENOMINATOR)
+    refund_or_owed = withheld_cents - tax_cents
+
+    return {
+        'taxable_income': taxable_cents,
+        'tax_owed': tax_cents,
+        'tax_owed_dollars': _round_half_even_array(numerator, RATE_DENOMINATOR * 100),
+        'after_tax_income': income_cents - tax_cents,
+        'marginal_rate': marginal_rate,
+        'refund_or_owed': refund_or_owed,
+        'is_refund': refund_or_owed > 0,
+        'net_payment': np.abs(refund_or_owed)
+    }
@@ -0,0 +1,72 @@
+"""
+Response compression for HTML and PDF responses.
+
+Uses brotli when the package is importable and the client accepts it,
+gzip otherwise. Responses that are streamed, already encoded, too small or
+that don't shrink are sent as-is.
+"""
+import gzip
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression configuration
+COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', '1') == '1'
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', '6'))
+COMPRESSIBLE_TYPES = ('text/html', 'application/pdf')
+
+logger = logging.getLogger(__name__)
+
+def choose_encoding(accept_encodings):
+    """
+    Best supported encoding the client accepts, or None. accept_encodings is
+    Werkzeug's parsed header (request.accept_encodings), so q-values and
+    wildcards count; q=0 means refused. Ties go to brotli.
+    """
+    supported = ('br', 'gzip') if brotli is not None else ('gzip',)
+    best = max(supported, key=lambda name: (accept_encodings[name], name == 'br'))
+    return best if accept_encodings[best] > 0 else None
+
+def compress(data, encoding):
+    if encoding == 'br':
+        # Brotli quality 11 is far too slow for per-request use; 5 beats gzip -6 at similar cost
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=COMPRESSION_LEVEL, mtime=0)
+
+def compress_response(response, accept_encodings):
+    """Compress a Flask response in place when it's worthwhile"""
+    if (response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or not 200 <= response.status_code < 300):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    compressed = compress(data, encoding)
+    if len(compressed) >= len(data):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # The representation changed, so a strong ETag must too
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+def install_compression(app):
+    """Compress eligible responses on the way out"""
+    if COMPRESSION_ENABLED:
+        from flask import request
+
+        @app.after_request
+        def _compress(response):
+            return compress_response(response, request.accept_encodings)
+    return app
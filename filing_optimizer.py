@@ -0,0 +1,110 @@
+"""
+Filing-strategy optimizer.
+
+Evaluates every candidate strategy (standard vs. itemized, two-year
+deduction bunching and, for couples with a known income split, joint vs.
+separate returns) in a single vectorized pass over the compiled bracket
+schedules, and ranks them by annual tax against the strategy
+calculate_tax would pick.
+
+The married-filing-separately schedule is only used here to price the
+separate-return candidates; the rest of the app accepts single and married.
+"""
+import numpy as np
+
+from tax_calculator import STANDARD_DEDUCTIONS_2025
+from tax_schedule import SCHEDULES_2025, compile_schedule, tax_on_taxable
+
+# 2025 married filing separately (IRS IR-2024-273)
+MARRIED_SEPARATE_BRACKETS_2025 = [
+    (11925, 0.10),
+    (48475, 0.12),
+    (103350, 0.22),
+    (197300, 0.24),
+    (250525, 0.32),
+    (375800, 0.35),
+    (float('inf'), 0.37)
+]
+MARRIED_SEPARATE_STANDARD_DEDUCTION_2025 = 15000
+
+OPTIMIZER_SCHEDULES = dict(SCHEDULES_2025, married_separate=compile_schedule(MARRIED_SEPARATE_BRACKETS_2025))
+
+STRATEGY_LABELS = {
+    'standard': 'Standard deduction',
+    'itemize': 'Itemize deductions',
+    'bunching': 'Bunch two years of deductions into one',
+    'separate_standard': 'Married filing separately, standard deductions',
+    'separate_itemize': 'Married filing separately, both itemize'
+}
+
+def optimize_filing_strategy(income, status, deductions, spouse_income=None, spouse_deductions=None):
+    """
+    Rank filing strategies by annual tax.
+
+    income and deductions are the household totals unless spouse_income is
+    given, in which case they are the first spouse's share and the joint
+    candidates use the sums. Bunching assumes the same deductions every
+    year, claimed as two years' worth every other year, and reports the
+    two-year average.
+    """
+    separate = status == 'married' and spouse_income is not None
+    if separate:
+        spouse_deductions = spouse_deductions or 0
+        household_income = income + spouse_income
+        household_deductions = deductions + spouse_deductions
+    else:
+        household_income, household_deductions = income, deductions
+    standard = STANDARD_DEDUCTIONS_2025[status]
+
+    # One row per tax computation: (strategy, weight, filing status, taxable income)
+    rows = [
+        ('standard', 1.0, status, household_income - standard),
+        ('itemize', 1.0, status, household_income - household_deductions),
+        ('bunching', 0.5, status, household_income - max(2 * household_deductions, standard)),
+        ('bunching', 0.5, status, household_income - standard)
+    ]
+    if separate:
+        separate_standard = MARRIED_SEPARATE_STANDARD_DEDUCTION_2025
+        rows += [
+            ('separate_standard', 1.0, 'married_separate', income - separate_standard),
+            ('separate_standard', 1.0, 'married_separate', spouse_income - separate_standard),
+            # If one spouse itemizes the other must too
+            ('separate_itemize', 1.0, 'married_separate', income - deductions),
+            ('separate_itemize', 1.0, 'married_separate', spouse_income - spouse_deductions)
+        ]
+
+    names, weights, statuses, taxable = zip(*rows)
+    taxes = np.asarray(tax_on_taxable(np.maximum(taxable, 0), np.array(statuses), OPTIMIZER_SCHEDULES)) * np.array(weights)
+
+    annual_tax = {}
+    for name, tax in zip(names, taxes.tolist()):
+        annual_tax[name] = annual_tax.get(name, 0.0) + tax
+
+    # Bunching only helps when one year's deductions fall short but two years' clear the standard
+    if not household_deductions < standard < 2 * household_deductions:
+        del annual_tax['bunching']
+    if household_deductions <= 0:
+        annual_tax.pop('itemize')
+        annual_tax.pop('separate_itemize', None)
+    baseline_name = 'standard' if household_deductions <= standard else 'itemize'
+    baseline = annual_tax[baseline_name]
+    ranked = sorted(annual_tax.items(), key=lambda item: item[1])
+
+    strategies = [
+        {
+            'strategy': name,
+            'label': STRATEGY_LABELS[name],
+            'filing_status': 'married_separate' if name.startswith('separate') else status,
+            'annual_tax': round(tax),
+            # Negative deltas are savings relative to the current strategy
+            'tax_delta': round(tax - baseline),
+            'is_current': name == baseline_name
+        }
+        for name, tax in ranked
+    ]
+    return {
+        'current_strategy': baseline_name,
+        'best_strategy': ranked[0][0],
+        'potential_savings': round(baseline - ranked[0][1]),
+        'strategies': strategies
+    }
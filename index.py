@@ -1,5 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, Response
-from tax_calculator import calculate_tax, validate_input, generate_tax_form_content
+from flask import Flask, render_template, request, redirect, url_for, jsonify, Response, g
+from tax_calculator import calculate_tax, compute_tax_figures, validate_input, generate_tax_form_content, LLM_USAGE
+from result_store import result_store
+from audit_log import setup_logging, create_audit_log
+from profiling import install_profiling
+from tax_schedule import SOLVERS
+from withholding import PAY_FREQUENCIES, generate_withholding_schedule, schedule_to_rows, schedule_to_csv
+from job_queue import JobQueue, JOB_RUNNER
+from filing_optimizer import optimize_filing_strategy
+from projection import project_tax, PROJECTION_SAMPLES, PROJECTION_SEED
+from page_cache import warm_templates, StaticPage, FragmentCache, fragment_key
+from compression import install_compression
+from admission import calculate_gate, form_gate, admission_metrics
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
 import os
 from datetime import datetime
 import logging
@@ -10,16 +24,64 @@ load_dotenv()
 
 app = Flask(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging (queued, formatted off the request thread)
+setup_logging(logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Opt-in request profiling, enabled by PROFILE_DIR
+install_profiling(app)
+
+# Append-only calculation audit trail, enabled by AUDIT_LOG_PATH
+audit_log = create_audit_log()
+
+# Bulk calculation jobs; run by `python job_queue.py` unless JOB_RUNNER=1
+job_queue = JobQueue()
+if JOB_RUNNER and multiprocessing.parent_process() is None:
+    job_queue.start()
+
+# Compile templates up front; serve the input page pre-rendered, advice cards from cache
+warm_templates(app)
+index_page = StaticPage(app, 'index.html')
+fragment_cache = FragmentCache()
+
+# gzip/brotli for HTML and PDF responses
+install_compression(app)
+
+# Balance due above which the results-page projection reports the chance of owing (underpayment penalty)
+PROJECTION_PENALTY_THRESHOLD = 1000
+
+# Render the PDF in the background right after /calculate so the download is instant
+PDF_PREFETCH = os.getenv('PDF_PREFETCH', '0') == '1'
+pdf_executor = ThreadPoolExecutor(max_workers=2) if PDF_PREFETCH else None
+
+def build_form_data(income, deductions, status, withheld, tax_result):
+    """Figures needed by generate_tax_form_content"""
+    return {
+        'income': income,
+        'deductions': deductions,
+        'status': status,
+        'tax_owed': tax_result['tax_owed'],
+        'after_tax_income': tax_result['after_tax_income'],
+        'taxable_income': tax_result['taxable_income'],
+        'federal_withheld': withheld,
+        'is_refund': tax_result['is_refund'],
+        'net_payment': tax_result['net_payment']
+    }
+
+def prefetch_pdf(result_id, form_data):
+    """Generate the PDF for a stored result ahead of the download request"""
+    try:
+        result_store.put_pdf(result_id, generate_tax_form_content(form_data))
+    except Exception as e:
+        logger.warning("PDF prefetch failed: %s", e)
+
 @app.route('/')
 def index():
     """Main page with tax input form"""
-    return render_template('index.html')
+    return index_page.response()
 
 @app.route('/calculate', methods=['POST'])
+@calculate_gate.limit
 def calculate():
     """Process tax calculation and display results"""
     try:
@@ -28,19 +90,26 @@ def calculate():
         deductions_str = request.form.get('deductions', '').strip()
         status = request.form.get('status', '').strip()
         withheld_str = request.form.get('withheld', '').strip()
+        uncertainty_str = request.form.get('income_uncertainty', '').strip()
         
         # Validate input
         validation_result = validate_input(income_str, deductions_str, status, withheld_str)
         if not validation_result['valid']:
             return render_template('index.html', error=validation_result['error'])
+        try:
+            income_uncertainty = float(uncertainty_str) if uncertainty_str else 0.0
+        except ValueError:
+            income_uncertainty = -1.0
+        if not 0 <= income_uncertainty <= 100:
+            return render_template('index.html', error='Income uncertainty must be a percentage between 0 and 100.')
         
         # Convert to float after validation
         income = float(income_str)
         deductions = float(deductions_str)
         withheld = float(withheld_str)
         
-        # Calculate tax
-        tax_result = calculate_tax(income, status, deductions, withheld)
+        # Calculate tax; under load skip the LLM and serve rule-based advice
+        tax_result = calculate_tax(income, status, deductions, withheld, use_llm=not g.degraded)
         
         # Prepare results for display
         results = {
@@ -57,39 +126,87 @@ def calculate():
             'is_refund': tax_result['is_refund'],
             'net_payment': tax_result['net_payment'],
             'deduction_analysis': tax_result['deduction_analysis'],
+            'filing_strategies': optimize_filing_strategy(income, status, deductions),
+            'income_uncertainty': income_uncertainty,
+            'projection': None,
             'calculation_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
-        logger.info(f"Tax calculation completed for income: ${income}, status: {status}, withheld: ${withheld}")
+        # Uncertain income: simulate the year-end outcome around the point estimate
+        if income_uncertainty > 0 and income > 0:
+            results['projection'] = project_tax(
+                {'dist': 'lognormal', 'mean': income, 'sd': income * income_uncertainty / 100},
+                status, deductions, withheld, threshold=PROJECTION_PENALTY_THRESHOLD
+            )
+        
+        # Advice cards only change with the advice and the inputs it was estimated from
+        deduction_analysis = tax_result['deduction_analysis']
+        results['advice_cards'] = fragment_cache.render(
+            fragment_key('advice_cards', deduction_analysis.get('advice_key'), income, status, deductions),
+            '_advice_cards.html',
+            deduction_analysis=deduction_analysis
+        )
+        
+        # Keep the form figures server-side so /generate_form never trusts client totals
+        form_data = build_form_data(income, deductions, status, withheld, tax_result)
+        results['result_id'] = result_store.put_result(form_data)
+        if pdf_executor is not None and not g.degraded:
+            pdf_executor.submit(prefetch_pdf, results['result_id'], form_data)
+        
+        if audit_log is not None:
+            audit_log.record({
+                'event': 'calculation',
+                'result_id': results['result_id'],
+                'income': income,
+                'deductions': deductions,
+                'status': status,
+                'withheld': withheld,
+                'taxable_income': tax_result['taxable_income'],
+                'tax_owed': tax_result['tax_owed'],
+                'refund_or_owed': tax_result['refund_or_owed']
+            })
+        
+        logger.info("Tax calculation completed for income: $%s, status: %s, withheld: $%s", income, status, withheld)
         
         return render_template('result.html', **results)
         
     except ValueError as e:
-        logger.error(f"ValueError in tax calculation: {e}")
+        logger.error("ValueError in tax calculation: %s", e)
         return render_template('index.html', error='Invalid input data. Please check your entries.')
     except Exception as e:
-        logger.error(f"Unexpected error in tax calculation: {e}")
+        logger.error("Unexpected error in tax calculation: %s", e)
         return render_template('index.html', error='An unexpected error occurred. Please try again.')
 
-@app.route('/generate_form', methods=['POST'])
+@app.route('/generate_form', methods=['GET', 'POST'])
+@form_gate.limit
 def generate_form():
     """Generate and download tax form - modified for serverless environment"""
     try:
-        # Get calculation data from form
-        data = {
-            'income': float(request.form.get('income')),
-            'deductions': float(request.form.get('deductions')),
-            'status': request.form.get('status'),
-            'tax_owed': float(request.form.get('tax_owed')),
-            'after_tax_income': float(request.form.get('after_tax_income')),
-            'taxable_income': float(request.form.get('taxable_income')),
-            'federal_withheld': float(request.form.get('withheld', 0)),
-            'is_refund': request.form.get('is_refund') == 'True',
-            'net_payment': float(request.form.get('net_payment', 0))
-        }
+        result_id = request.values.get('id', '')
+        data = result_store.get_result(result_id)
+        pdf_content = result_store.get_pdf(result_id) if data is not None else None
+        
+        if data is None:
+            # Stored result expired or lives on another instance: recompute from the raw inputs
+            income_str = request.values.get('income', '').strip()
+            deductions_str = request.values.get('deductions', '').strip()
+            status = request.values.get('status', '').strip()
+            withheld_str = request.values.get('withheld', '').strip()
+            
+            validation_result = validate_input(income_str, deductions_str, status, withheld_str)
+            if not validation_result['valid']:
+                return render_template('index.html', error='Your calculation has expired. Please calculate again.')
+            
+            income = float(income_str)
+            deductions = float(deductions_str)
+            withheld = float(withheld_str)
+            tax_result = compute_tax_figures(income, status, deductions, withheld)
+            data = build_form_data(income, deductions, status, withheld, tax_result)
         
-        # Generate tax form content (returns PDF bytes)
-        pdf_content = generate_tax_form_content(data)
+        if pdf_content is None:
+            # Generate tax form content (returns PDF bytes)
+            pdf_content = generate_tax_form_content(data)
+            result_store.put_pdf(result_id, pdf_content)
         
         logger.info("Tax form generated successfully")
         
@@ -104,7 +221,7 @@ def generate_form():
         return response
         
     except Exception as e:
-        logger.error(f"Error generating tax form: {e}")
+        logger.error("Error generating tax form: %s", e)
         return render_template('index.html', error='Error generating tax form. Please try again.')
 
 @app.route('/api/validate', methods=['POST'])
@@ -122,6 +239,172 @@ def validate_api():
     except Exception as e:
         return jsonify({'valid': False, 'error': 'Validation error occurred'})
 
+class InvalidRequestBody(Exception):
+    """A JSON API request whose body isn't a JSON object"""
+
+def json_object_body():
+    """The request's JSON body; raises InvalidRequestBody (answered with a 400) unless it's an object"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise InvalidRequestBody('Request body must be a JSON object')
+    return data
+
+@app.errorhandler(InvalidRequestBody)
+def invalid_request_body(error):
+    return jsonify({'error': str(error)}), 400
+
+def to_json_amounts(values):
+    """Round solver output to cents for JSON, mapping NaN (no solution) to None"""
+    rounded = np.round(np.asarray(values, dtype=float), 2)
+    if rounded.ndim == 0:
+        return None if np.isnan(rounded) else float(rounded)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+@app.route('/api/solve', methods=['POST'])
+def solve_api():
+    """Closed-form inverse solvers (gross-up, break-even withholding, target refund)"""
+    try:
+        data = json_object_body()
+        solver_name = data.get('solve', '')
+        if not isinstance(solver_name, str) or solver_name not in SOLVERS:
+            return jsonify({'error': f"Unknown solver. Choose one of: {', '.join(SOLVERS)}"}), 400
+        
+        solver, required, optional = SOLVERS[solver_name]
+        missing = [field for field in ('status',) + required if field not in data]
+        if missing:
+            return jsonify({'error': f"Missing fields: {', '.join(missing)}"}), 400
+        
+        arguments = {field: np.asarray(data[field], dtype=float) for field in required + optional if field in data}
+        arguments['status'] = data['status'] if isinstance(data['status'], str) else np.asarray(data['status'])
+        result = solver(**arguments)
+        
+        return jsonify({'solve': solver_name, 'result': to_json_amounts(result)})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid solver input: {e}"}), 400
+
+@app.route('/api/withholding_schedule', methods=['POST'])
+def withholding_schedule_api():
+    """Per-pay-period withholding plan for a batch of employees (JSON or CSV)"""
+    try:
+        data = json_object_body()
+        employees = data.get('employees') or []
+        if not isinstance(employees, list) or not all(isinstance(e, dict) for e in employees):
+            return jsonify({'error': 'employees must be a list of objects'}), 400
+        if not employees:
+            return jsonify({'error': 'employees must be a non-empty list'}), 400
+        
+        periods_per_year = []
+        for employee in employees:
+            frequency = employee.get('pay_frequency', 'biweekly')
+            if frequency not in PAY_FREQUENCIES:
+                return jsonify({'error': f"Unknown pay_frequency: {frequency}"}), 400
+            periods_per_year.append(employee.get('periods_per_year', PAY_FREQUENCIES[frequency]))
+        
+        schedule = generate_withholding_schedule(
+            ytd_income=[float(e.get('ytd_income', 0)) for e in employees],
+            ytd_withheld=[float(e.get('ytd_withheld', 0)) for e in employees],
+            status=[e.get('status', '') for e in employees],
+            periods_elapsed=[int(e.get('periods_elapsed', 0)) for e in employees],
+            periods_per_year=periods_per_year,
+            deductions=[float(e.get('deductions', 0)) for e in employees],
+            target_refund=[float(e.get('target_refund', 0)) for e in employees],
+            pay_per_period=[
+                float(e['pay_per_period']) if e.get('pay_per_period') is not None else np.nan for e in employees
+            ]
+        )
+        rows = schedule_to_rows(schedule, [e.get('id', i) for i, e in enumerate(employees)])
+        
+        if request.args.get('format', data.get('format')) == 'csv':
+            return Response(
+                schedule_to_csv(rows),
+                mimetype='text/csv',
+                headers={'Content-Disposition': 'attachment; filename=withholding_schedule.csv'}
+            )
+        return jsonify({'schedules': rows})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid withholding input: {e}"}), 400
+
+@app.route('/api/optimize', methods=['POST'])
+def optimize_api():
+    """Rank filing strategies, including joint vs. separate when the spouse split is given"""
+    data = json_object_body()
+    status = data.get('status', '')
+    if status not in ('single', 'married'):
+        return jsonify({'error': 'status must be single or married'}), 400
+    try:
+        spouse_income = data.get('spouse_income')
+        result = optimize_filing_strategy(
+            float(data.get('income', 0)),
+            status,
+            float(data.get('deductions', 0)),
+            spouse_income=float(spouse_income) if spouse_income is not None else None,
+            spouse_deductions=float(data.get('spouse_deductions', 0))
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': 'income and deductions must be numbers'}), 400
+    return jsonify(result)
+
+@app.route('/api/projection', methods=['POST'])
+def projection_api():
+    """Monte Carlo projection of tax owed and refund for uncertain income, deductions and withholding"""
+    data = json_object_body()
+    try:
+        result = project_tax(
+            data.get('income', 0),
+            data.get('status', ''),
+            data.get('deductions', 0),
+            data.get('withheld', 0),
+            threshold=float(data.get('threshold', 0)),
+            samples=int(data.get('samples', PROJECTION_SAMPLES)),
+            seed=int(data.get('seed', PROJECTION_SEED))
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e) or 'Invalid projection parameters'}), 400
+    return jsonify(result)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job_api():
+    """Queue a bulk calculation (and optional form generation) job"""
+    data = json_object_body()
+    records = data.get('records')
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'records must be a non-empty list'}), 400
+    if not all(isinstance(record, dict) for record in records):
+        return jsonify({'error': 'records must be a list of objects'}), 400
+    try:
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    if chunk_size is not None and chunk_size <= 0:
+        return jsonify({'error': 'chunk_size must be positive'}), 400
+    
+    job_id = job_queue.submit(records, chunk_size=chunk_size, generate_forms=bool(data.get('generate_forms')))
+    return jsonify(job_queue.status(job_id)), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+def job_api(job_id):
+    """Job progress (GET) or cancellation (DELETE)"""
+    if request.method == 'DELETE' and not job_queue.cancel(job_id) and job_queue.status(job_id) is not None:
+        return jsonify(dict(job_queue.status(job_id), error='Job already finished')), 409
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<job_id>/results')
+def job_results_api(job_id):
+    """Page through a job's per-record results"""
+    if job_queue.status(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    return jsonify({'results': job_queue.results(job_id, offset, limit), 'offset': offset})
+
+@app.route('/api/metrics')
+def metrics_api():
+    """Admission control and LLM usage counters for this worker"""
+    return jsonify({'admission': admission_metrics(), 'llm_usage': dict(LLM_USAGE)})
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('error.html', error="Page not found"), 404
@@ -0,0 +1,330 @@
+"""
+Resumable background job queue for bulk calculations and tax forms.
+
+Jobs and their input records live in SQLite. A dispatcher thread splits
+each job into chunks of JOB_CHUNK_SIZE records and runs them on a pool of
+JOB_WORKERS processes (calculate_tax, plus generate_tax_form_content when
+forms are requested). Each chunk gets its LLM advice in one batched pass
+(see advice_batch.py) unless ADVICE_BATCH_SIZE is 1. The contiguous completed prefix of each job is
+checkpointed after every chunk, so a restarted dispatcher resumes from the
+checkpoint instead of from zero.
+
+Run the dispatcher standalone with `python job_queue.py` next to the web
+workers, pointed at the same JOB_QUEUE_PATH. JOB_RUNNER=1 runs one inside
+the web process instead, which only suits a single-process development
+server. Several dispatchers may share a queue file: each job is claimed atomically with a lease that its dispatcher renews
+while it runs; a job whose lease lapses because its dispatcher died is
+taken over by another from the checkpoint.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Job queue configuration
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', '/tmp/tax_jobs.sqlite3')
+JOB_OUTPUT_DIR = os.getenv('JOB_OUTPUT_DIR', '/tmp/tax_job_forms')
+JOB_CHUNK_SIZE = int(os.getenv('JOB_CHUNK_SIZE', '500'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', str(os.cpu_count() or 2)))
+JOB_RUNNER = os.getenv('JOB_RUNNER', '0') == '1'
+JOB_POLL_INTERVAL = 2.0
+JOB_LEASE_SECONDS = 30.0
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    checkpoint INTEGER NOT NULL DEFAULT 0,
+    generate_forms INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner TEXT,
+    lease_until REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_records (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+'''
+
+def process_chunk(job_id, start, records, generate_forms, output_dir):
+    """Worker-process entry point: calculate (and optionally render) one chunk"""
+    from tax_calculator import calculate_tax, validate_input, generate_tax_form_content
+    from advice_batch import ADVICE_BATCH_SIZE, generate_batch_advice
+
+    results = []
+    filers = []  # (idx, income, deductions, status, withheld) for valid records
+    for offset, record in enumerate(records):
+        idx = start + offset
+        if not isinstance(record, dict):
+            results.append((idx, {'error': 'Record must be an object'}))
+            continue
+        income, deductions = str(record.get('income', '')), str(record.get('deductions', ''))
+        status, withheld = str(record.get('status', '')), str(record.get('withheld', '0'))
+        validation = validate_input(income, deductions, status, withheld)
+        if not validation['valid']:
+            results.append((idx, {'error': validation['error']}))
+            continue
+        filers.append((idx, float(income), float(deductions), status, float(withheld)))
+
+    # One batched advice pass per chunk instead of one LLM call per record
+    advice = None
+    if ADVICE_BATCH_SIZE > 1:
+        try:
+            advice = generate_batch_advice([(income, status, deductions) for _, income, deductions, status, _ in filers])
+        except Exception as e:
+            logger.warning("Batched advice failed for job %s chunk %d, using rule-based advice: %s", job_id, start, e)
+            advice = [None] * len(filers)
+
+    for n, (idx, income, deductions, status, withheld) in enumerate(filers):
+        # One bad record becomes an error row instead of failing the whole job
+        try:
+            if advice is not None:
+                # Records the batch couldn't advise on get the rule-based advice
+                tax_result = calculate_tax(income, status, deductions, withheld, use_llm=False, llm_advice=advice[n])
+            else:
+                tax_result = calculate_tax(income, status, deductions, withheld)
+            if generate_forms:
+                form_path = os.path.join(output_dir, job_id, f"form_{idx:07d}.pdf")
+                with open(form_path, 'wb') as f:
+                    f.write(generate_tax_form_content({
+                        'income': income,
+                        'deductions': deductions,
+                        'status': status,
+                        'tax_owed': tax_result['tax_owed'],
+                        'after_tax_income': tax_result['after_tax_income'],
+                        'taxable_income': tax_result['taxable_income'],
+                        'federal_withheld': withheld,
+                        'is_refund': tax_result['is_refund'],
+                        'net_payment': tax_result['net_payment']
+                    }))
+                tax_result['form_path'] = form_path
+        except Exception as e:
+            logger.error("Job %s record %d failed: %s", job_id, idx, e)
+            tax_result = {'error': str(e) or type(e).__name__}
+        results.append((idx, tax_result))
+    results.sort(key=lambda item: item[0])
+    return start, len(records), results
+
+class JobQueue:
+    """SQLite-backed job store plus the chunk dispatcher"""
+
+    def __init__(self, path=JOB_QUEUE_PATH, output_dir=JOB_OUTPUT_DIR,
+                 workers=JOB_WORKERS, chunk_size=JOB_CHUNK_SIZE):
+        self.path = path
+        self.output_dir = output_dir
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._dispatcher = None
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        # Queue files created before leases existed
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+        for column, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+
+    def _conn(self):
+        # One connection per thread; SQLite serializes writers across processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def submit(self, records, chunk_size=None, generate_forms=False):
+        """Persist a new job and its records; returns the job ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute(
+                'INSERT INTO jobs (id, status, total, chunk_size, generate_forms, created, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, 'queued', len(records), chunk_size or self.chunk_size, int(generate_forms), now, now)
+            )
+            conn.executemany(
+                'INSERT INTO job_records (job_id, idx, payload) VALUES (?, ?, ?)',
+                ((job_id, idx, json.dumps(record)) for idx, record in enumerate(records))
+            )
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id):
+        """Progress summary for a job, or None if it doesn't exist"""
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'total': row['total'],
+            'completed': row['checkpoint'],
+            'progress': round(100 * row['checkpoint'] / row['total'], 1) if row['total'] else 100.0,
+            'chunk_size': row['chunk_size'],
+            'generate_forms': bool(row['generate_forms']),
+            'error': row['error'],
+            'created': row['created'],
+            'updated': row['updated']
+        }
+
+    def results(self, job_id, offset=0, limit=100):
+        offset, limit = max(offset, 0), max(limit, 1)
+        rows = self._conn().execute(
+            'SELECT idx, result FROM job_results WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?',
+            (job_id, offset, limit)
+        ).fetchall()
+        return [dict(json.loads(row['result']), index=row['idx']) for row in rows]
+
+    def cancel(self, job_id):
+        """Stop a queued or running job after its in-flight chunks; returns False if already finished"""
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status IN (?, ?)",
+            (time.time(), job_id) + ACTIVE_STATUSES
+        )
+        return cursor.rowcount > 0
+
+    def start(self):
+        """Start the dispatcher thread; unfinished jobs resume from their checkpoints"""
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _claim_next(self):
+        """Atomically take the oldest queued job, or a running one whose lease lapsed"""
+        claimable = "(status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?)))"
+        conn = self._conn()
+        now = time.time()
+        for row in conn.execute(f'SELECT id FROM jobs WHERE {claimable} ORDER BY created', (now,)).fetchall():
+            cursor = conn.execute(
+                f"UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated = ? "
+                f"WHERE id = ? AND {claimable}",
+                (self.owner, now + JOB_LEASE_SECONDS, now, row['id'], now)
+            )
+            if cursor.rowcount:
+                return row['id']
+        return None
+
+    def _renew_lease(self, job_id, checkpoint):
+        """Record progress and extend the lease; False if another dispatcher took the job over"""
+        now = time.time()
+        cursor = self._conn().execute(
+            'UPDATE jobs SET checkpoint = ?, lease_until = ?, updated = ? WHERE id = ? AND owner = ?',
+            (checkpoint, now + JOB_LEASE_SECONDS, now, job_id, self.owner)
+        )
+        return cursor.rowcount > 0
+
+    def _dispatch_loop(self):
+        while True:
+            job_id = self._claim_next()
+            if job_id is None:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                logger.error("Job %s failed: %s", job_id, e)
+                self._conn().execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated = ? "
+                    "WHERE id = ? AND owner = ?",
+                    (str(e), time.time(), job_id, self.owner)
+                )
+
+    def _current_status(self, job_id):
+        return self._conn().execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()['status']
+
+    def _run_job(self, job_id):
+        conn = self._conn()
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if job['generate_forms']:
+            os.makedirs(os.path.join(self.output_dir, job_id), exist_ok=True)
+
+        chunk_size, total = job['chunk_size'], job['total']
+        checkpoint = job['checkpoint']
+        next_start = checkpoint
+        finished_chunks = {}  # start -> length, for chunks completed past the checkpoint
+        in_flight = set()
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            while checkpoint < total:
+                cancelled = self._current_status(job_id) == 'cancelled'
+                if cancelled:
+                    # Drop chunks that haven't started; running ones finish and are kept
+                    in_flight = {future for future in in_flight if not future.cancel()}
+                while not cancelled and next_start < total and len(in_flight) < self.workers * 2:
+                    records = [
+                        json.loads(r['payload']) for r in conn.execute(
+                            'SELECT payload FROM job_records WHERE job_id = ? AND idx >= ? AND idx < ? ORDER BY idx',
+                            (job_id, next_start, next_start + chunk_size)
+                        )
+                    ]
+                    in_flight.add(pool.submit(
+                        process_chunk, job_id, next_start, records, bool(job['generate_forms']), self.output_dir
+                    ))
+                    next_start += chunk_size
+                if not in_flight:
+                    break
+
+                # Wake up well inside the lease to renew it even while long chunks run
+                done, in_flight = wait(in_flight, timeout=JOB_LEASE_SECONDS / 3, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, length, results = future.result()
+                    with conn:
+                        conn.execute('BEGIN')
+                        conn.executemany(
+                            'INSERT OR REPLACE INTO job_results (job_id, idx, result) VALUES (?, ?, ?)',
+                            ((job_id, idx, json.dumps(result)) for idx, result in results)
+                        )
+                    finished_chunks[start] = length
+
+                # Advance the checkpoint over the contiguous completed prefix
+                while checkpoint in finished_chunks:
+                    checkpoint += finished_chunks.pop(checkpoint)
+                if not self._renew_lease(job_id, checkpoint):
+                    logger.warning("Lost the lease on job %s, leaving it to its new owner", job_id)
+                    for future in in_flight:
+                        future.cancel()
+                    return
+
+        cursor = conn.execute(
+            "UPDATE jobs SET status = 'completed', lease_until = NULL, updated = ? "
+            "WHERE id = ? AND owner = ? AND status = 'running' AND checkpoint >= total",
+            (time.time(), job_id, self.owner)
+        )
+        if cursor.rowcount:
+            logger.info("Job %s completed (%d records)", job_id, total)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    queue = JobQueue()
+    queue.start()
+    queue._dispatcher.join()
@@ -0,0 +1,97 @@
+"""
+Rendered-page caching for the Flask templates.
+
+- warm_templates compiles every template at startup instead of on first use
+- StaticPage renders a template once and serves it with ETag/Last-Modified,
+  answering conditional requests with 304
+- FragmentCache keeps rendered HTML fragments (the advice cards) keyed by
+  their inputs, in the shared cache when one is configured
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+
+from flask import Response, render_template, request
+from markupsafe import Markup
+
+from compression import COMPRESSION_ENABLED, choose_encoding, compress
+from result_store import MemoryBackend
+from shared_cache import get_shared_cache
+
+# Fragment cache configuration
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', '512'))
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', '3600'))
+
+logger = logging.getLogger(__name__)
+
+def warm_templates(app):
+    """Load and compile every template into the Jinja cache"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    logger.info("Compiled %d templates", len(names))
+
+class StaticPage:
+    """A template without per-request variables, rendered once"""
+
+    def __init__(self, app, template_name):
+        self.template_name = template_name
+        self.body = None
+        self.etag = None
+        self.encoded = {}
+        # Last-Modified is the template's mtime, so a redeploy with changes invalidates clients
+        _, filename, _ = app.jinja_env.loader.get_source(app.jinja_env, template_name)
+        self.last_modified = int(os.path.getmtime(filename)) if filename else int(time.time())
+
+    def response(self):
+        if self.body is None:
+            body = render_template(self.template_name).encode('utf-8')
+            self.etag = hashlib.sha256(body).hexdigest()[:32]
+            self.body = body
+
+        # Compressed variants are cached too, each with its own ETag
+        encoding = choose_encoding(request.accept_encodings) if COMPRESSION_ENABLED else None
+        if encoding is not None:
+            if encoding not in self.encoded:
+                self.encoded[encoding] = compress(self.body, encoding)
+            response = Response(self.encoded[encoding], mimetype='text/html')
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f"{self.etag}-{encoding}")
+        else:
+            response = Response(self.body, mimetype='text/html')
+            response.set_etag(self.etag)
+        response.vary.add('Accept-Encoding')
+        response.last_modified = self.last_modified
+        response.cache_control.no_cache = True  # Cache, but revalidate with the ETag
+        return response.make_conditional(request)
+
+def fragment_key(*parts):
+    """Cache key for a fragment rendered from JSON-serializable inputs"""
+    encoded = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return 'fragment:' + hashlib.sha256(encoded).hexdigest()
+
+class FragmentCache:
+    """Rendered HTML fragments, host-wide when the shared cache is enabled"""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE, ttl=FRAGMENT_CACHE_TTL):
+        self.ttl = ttl
+        self.shared = get_shared_cache()
+        self.local = MemoryBackend(max_entries=max_entries, ttl=ttl) if self.shared is None else None
+
+    def render(self, key, template_name, **context):
+        """Return the cached fragment for key, rendering and storing it on a miss"""
+        if self.shared is not None:
+            cached = self.shared.get(key)
+        else:
+            cached = self.local.get(key)
+        if cached is not None:
+            return Markup(cached.decode('utf-8'))
+
+        html = render_template(template_name, **context)
+        if self.shared is not None:
+            self.shared.set(key, html.encode('utf-8'), ttl=self.ttl)
+        else:
+            self.local.set(key, html.encode('utf-8'))
+        return Markup(html)
@@ -0,0 +1,210 @@
+"""
+Opt-in per-request profiling for the Flask app.
+
+Requests carrying the configured token in the X-Profile-Token header run
+under cProfile plus a stack sampler and get their own report. cProfile is
+process-wide on Python 3.12+, so only one request is profiled at a time;
+overlapping ones fall back to the sampler. A random PROFILE_SAMPLE_RATE
+fraction of other requests runs under the sampler only, and their stacks
+are merged into one report per PROFILE_AGGREGATE_INTERVAL. Reports are
+written to PROFILE_DIR as .pstats and flamegraph-compatible .collapsed
+files, keeping the newest PROFILE_MAX_FILES.
+"""
+import atexit
+import cProfile
+import hmac
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# Profiling configuration (disabled unless a directory is set)
+PROFILE_DIR = os.getenv('PROFILE_DIR')
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_SAMPLER_INTERVAL = float(os.getenv('PROFILE_SAMPLER_INTERVAL', '0.005'))
+PROFILE_AGGREGATE_INTERVAL = float(os.getenv('PROFILE_AGGREGATE_INTERVAL', '60'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+
+logger = logging.getLogger(__name__)
+
+# Held while a request runs under cProfile
+_full_profile_lock = threading.Lock()
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id, interval=PROFILE_SAMPLER_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.ident is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def collapsed(self):
+        """Stacks in Brendan Gregg's collapsed format (one 'a;b;c count' per line)"""
+        return collapsed(self.stacks)
+
+def collapsed(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+class ProfilingMiddleware:
+    """WSGI middleware that profiles authorized or randomly sampled requests"""
+
+    def __init__(self, wsgi_app, output_dir=PROFILE_DIR, token=PROFILE_TOKEN,
+                 sample_rate=PROFILE_SAMPLE_RATE, aggregate_interval=PROFILE_AGGREGATE_INTERVAL,
+                 max_files=PROFILE_MAX_FILES):
+        self.wsgi_app = wsgi_app
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_rate = sample_rate
+        self.aggregate_interval = aggregate_interval
+        self.max_files = max_files
+        self._report_ids = itertools.count(1)
+        # Sampled requests' stacks for the current interval
+        self._aggregate = Counter()
+        self._aggregate_requests = 0
+        self._aggregate_start = time.time()
+        self._aggregate_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+        atexit.register(self.flush)
+
+    def _is_authorized(self, environ):
+        if not self.token:
+            return False
+        # Header only: a query-string token would leak into access logs and Referer headers
+        supplied = environ.get('HTTP_X_PROFILE_TOKEN', '')
+        return hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def __call__(self, environ, start_response):
+        full_profile = self._is_authorized(environ)
+        if not full_profile and not (self.sample_rate and random.random() < self.sample_rate):
+            return self.wsgi_app(environ, start_response)
+
+        sampler = StackSampler(threading.get_ident())
+        profiler = None
+        # Busy profiler: this authorized request still gets a sampler-only report
+        if full_profile and _full_profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        app_iter = None
+        try:
+            sampler.start()
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # Another profiling tool (a debugger, say) owns the process-wide hook
+                    _full_profile_lock.release()
+                    profiler = None
+            # Drain the body inside the profiled region so streaming work is included
+            app_iter = self.wsgi_app(environ, start_response)
+            body = list(app_iter)
+        finally:
+            try:
+                # Run the response's close() and call_on_close hooks, as the server would have
+                if hasattr(app_iter, 'close'):
+                    app_iter.close()
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                    _full_profile_lock.release()
+                sampler.stop()
+            if full_profile:
+                self._save(environ, profiler, sampler, time.perf_counter() - start)
+            else:
+                self._add_sample(sampler)
+        return body
+
+    def _add_sample(self, sampler):
+        """Merge a sampled request into the current interval, writing it out once the interval ends"""
+        with self._aggregate_lock:
+            self._aggregate.update(sampler.stacks)
+            self._aggregate_requests += 1
+            if time.time() - self._aggregate_start < self.aggregate_interval:
+                return
+            stacks, requests, started = self._take_aggregate()
+        self._write_aggregate(stacks, requests, started)
+
+    def _take_aggregate(self):
+        stacks, requests, started = self._aggregate, self._aggregate_requests, self._aggregate_start
+        self._aggregate, self._aggregate_requests, self._aggregate_start = Counter(), 0, time.time()
+        return stacks, requests, started
+
+    def flush(self):
+        """Write out the current interval's sampled stacks, if any"""
+        with self._aggregate_lock:
+            if not self._aggregate_requests:
+                return
+            stacks, requests, started = self._take_aggregate()
+        self._write_aggregate(stacks, requests, started)
+
+    def _write_aggregate(self, stacks, requests, started):
+        name = f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(started))}_sampled_{requests}req_{os.getpid()}_{next(self._report_ids)}"
+        try:
+            with open(os.path.join(self.output_dir, name + '.collapsed'), 'w', encoding='utf-8') as f:
+                f.write(collapsed(stacks))
+        except OSError as e:
+            logger.warning("Failed to write sampled profile: %s", e)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest reports beyond max_files"""
+        with self._write_lock:
+            try:
+                reports = [
+                    entry for entry in os.scandir(self.output_dir)
+                    if entry.is_file() and entry.name.endswith(('.pstats', '.collapsed'))
+                ]
+                reports.sort(key=lambda entry: entry.stat().st_mtime)
+                for entry in reports[:max(len(reports) - self.max_files, 0)]:
+                    os.remove(entry.path)
+            except OSError as e:
+                logger.warning("Failed to prune profiles in %s: %s", self.output_dir, e)
+
+    def _save(self, environ, profiler, sampler, elapsed):
+        path = re.sub(r'[^A-Za-z0-9]+', '_', environ.get('PATH_INFO', '/')).strip('_') or 'root'
+        # pid and a per-process sequence number keep concurrent reports from overwriting each other
+        name = (f"{time.strftime('%Y%m%d_%H%M%S')}_{environ.get('REQUEST_METHOD', 'GET')}_{path}_"
+                f"{elapsed * 1000:.0f}ms_{os.getpid()}_{next(self._report_ids)}")
+        base = os.path.join(self.output_dir, name)
+        try:
+            if profiler is not None:
+                profiler.dump_stats(base + '.pstats')
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+        except OSError as e:
+            logger.warning("Failed to write profile for %s: %s", path, e)
+        self._prune()
+
+def install_profiling(app):
+    """Wrap the Flask app's WSGI callable when PROFILE_DIR is configured"""
+    if PROFILE_DIR and (PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0):
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+        logger.info("Request profiling enabled, reports in %s", PROFILE_DIR)
+    return app
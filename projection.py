@@ -0,0 +1,94 @@
+"""
+Monte Carlo projection of year-end tax liability.
+
+Income, deductions and withholding can each be a point value or a
+distribution. project_tax draws PROJECTION_SAMPLES independent samples of
+each from a seeded NumPy generator, runs them through the compiled bracket
+schedule in one vectorized pass and summarizes the spread of tax owed and
+refund (negative refund = balance due).
+
+Distribution specs are JSON objects:
+    {"dist": "normal", "mean": 80000, "sd": 15000}
+    {"dist": "lognormal", "mean": 80000, "sd": 15000}
+    {"dist": "uniform", "low": 60000, "high": 100000}
+    {"dist": "triangular", "low": 50000, "mode": 80000, "high": 120000}
+Samples are clipped at zero.
+"""
+import os
+
+import numpy as np
+
+from tax_calculator import STANDARD_DEDUCTIONS_2025
+from tax_schedule import tax_on_taxable
+
+# Projection configuration
+PROJECTION_SAMPLES = int(os.getenv('PROJECTION_SAMPLES', '20000'))
+PROJECTION_MAX_SAMPLES = int(os.getenv('PROJECTION_MAX_SAMPLES', '200000'))
+PROJECTION_SEED = int(os.getenv('PROJECTION_SEED', '2025'))
+PROJECTION_PERCENTILES = (5, 25, 50, 75, 95)
+
+def _param(spec, name):
+    value = float(spec[name])
+    if not np.isfinite(value):
+        raise ValueError(f"{name} must be finite")
+    return value
+
+def sample_distribution(spec, rng, size):
+    """Draw size samples for a point value or distribution spec"""
+    if not isinstance(spec, dict):
+        return np.full(size, max(float(spec), 0.0))
+
+    dist = spec.get('dist')
+    try:
+        if dist == 'normal':
+            samples = rng.normal(_param(spec, 'mean'), _param(spec, 'sd'), size)
+        elif dist == 'lognormal':
+            # Parameterized by the mean and sd of the amount itself, not of its log
+            mean, sd = _param(spec, 'mean'), _param(spec, 'sd')
+            if mean <= 0:
+                raise ValueError("lognormal mean must be positive")
+            sigma2 = np.log1p((sd / mean) ** 2)
+            samples = rng.lognormal(np.log(mean) - sigma2 / 2, np.sqrt(sigma2), size)
+        elif dist == 'uniform':
+            samples = rng.uniform(_param(spec, 'low'), _param(spec, 'high'), size)
+        elif dist == 'triangular':
+            samples = rng.triangular(_param(spec, 'low'), _param(spec, 'mode'), _param(spec, 'high'), size)
+        else:
+            raise ValueError(f"Unknown distribution: {dist}")
+    except KeyError as e:
+        raise ValueError(f"{dist} distribution requires {e.args[0]}")
+    return np.maximum(samples, 0.0)
+
+def _percentiles(values, percentiles):
+    return {f"p{p}": round(float(v)) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+
+def project_tax(income, status, deductions=0, withheld=0, threshold=0, samples=PROJECTION_SAMPLES,
+                seed=PROJECTION_SEED, percentiles=PROJECTION_PERCENTILES):
+    """
+    Percentiles of tax owed and refund, and the probability of owing more
+    than threshold at filing, for uncertain income, deductions and withholding
+    """
+    if status not in STANDARD_DEDUCTIONS_2025:
+        raise ValueError(f"Unknown filing status: {status}")
+    if not 1 <= samples <= PROJECTION_MAX_SAMPLES:
+        raise ValueError(f"samples must be between 1 and {PROJECTION_MAX_SAMPLES}")
+
+    rng = np.random.default_rng(seed)
+    incomes = sample_distribution(income, rng, samples)
+    itemized = sample_distribution(deductions, rng, samples)
+    withholding = sample_distribution(withheld, rng, samples)
+
+    taxable = np.maximum(incomes - np.maximum(itemized, STANDARD_DEDUCTIONS_2025[status]), 0.0)
+    tax_owed = tax_on_taxable(taxable, status)
+    refund = withholding - tax_owed
+
+    return {
+        'samples': samples,
+        'seed': seed,
+        'threshold': threshold,
+        'tax_owed': _percentiles(tax_owed, percentiles),
+        'refund_or_owed': _percentiles(refund, percentiles),
+        'mean_tax_owed': round(float(tax_owed.mean())),
+        'probability_refund': round(float(np.mean(refund > 0)), 4),
+        'probability_owe_over_threshold': round(float(np.mean(-refund > threshold)), 4)
+    }
@@ -0,0 +1,174 @@
+"""
+Server-side store for calculation results and generated PDF bytes.
+
+/calculate saves the figures needed for the tax form under a short signed ID,
+so /generate_form can look them up instead of trusting hidden form fields
+posted back by the browser.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from shared_cache import get_shared_cache
+
+# Result store configuration
+RESULT_STORE_BACKEND = os.getenv('RESULT_STORE_BACKEND', 'memory')
+RESULT_STORE_PATH = os.getenv('RESULT_STORE_PATH', '/tmp/tax_results.sqlite3')
+RESULT_STORE_SIZE = int(os.getenv('RESULT_STORE_SIZE', '1024'))
+RESULT_STORE_TTL = int(os.getenv('RESULT_STORE_TTL', '3600'))
+
+# IDs are only valid across workers if they share the signing secret; without
+# one, the sqlite store keeps a generated secret in its own file
+RESULT_STORE_SECRET = os.getenv('RESULT_STORE_SECRET', '').encode()
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries=RESULT_STORE_SIZE, ttl=RESULT_STORE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class SQLiteBackend:
+    """SQLite file shared by every worker on the host"""
+
+    def __init__(self, path=RESULT_STORE_PATH, ttl=RESULT_STORE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)')
+
+    def shared_secret(self):
+        """Signing secret stored in the database; the first worker to ask generates it"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('secret', ?)", (secrets.token_bytes(32),)
+            )
+            return bytes(self._conn.execute("SELECT value FROM meta WHERE key = 'secret'").fetchone()[0])
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM entries WHERE key = ? AND expires >= ?', (key, time.time())
+            ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, value, now + self.ttl)
+            )
+            self._conn.execute('DELETE FROM entries WHERE expires < ?', (now,))
+
+class SharedCacheBackend:
+    """Host-wide shared-memory cache, so every worker sees every result"""
+
+    def __init__(self, cache, ttl=RESULT_STORE_TTL):
+        self.cache = cache
+        self.ttl = ttl
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, ttl=self.ttl)
+
+class ResultStore:
+    """Stores calculation figures and cached PDF bytes under signed IDs"""
+
+    def __init__(self, backend, secret=None):
+        self.backend = backend
+        self.secret = secret or secrets.token_bytes(32)
+
+    def _sign(self, token):
+        digest = hmac.new(self.secret, token.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:8]).decode().rstrip('=')
+
+    def verify_result_id(self, result_id):
+        """Check the signature on a result ID without touching the backend"""
+        if not result_id or result_id.count('.') != 1:
+            return False
+        token, signature = result_id.split('.')
+        return hmac.compare_digest(self._sign(token), signature)
+
+    def put_result(self, data):
+        """Store a JSON-serializable result and return its signed ID"""
+        token = secrets.token_urlsafe(9)
+        result_id = f"{token}.{self._sign(token)}"
+        self.backend.set(f"result:{token}", json.dumps(data).encode())
+        return result_id
+
+    def get_result(self, result_id):
+        """Return the stored result, or None for unknown, expired or forged IDs"""
+        if not self.verify_result_id(result_id):
+            return None
+        value = self.backend.get(f"result:{result_id.split('.')[0]}")
+        return json.loads(value) if value is not None else None
+
+    def put_pdf(self, result_id, pdf_bytes):
+        if self.verify_result_id(result_id):
+            self.backend.set(f"pdf:{result_id.split('.')[0]}", pdf_bytes)
+
+    def get_pdf(self, result_id):
+        if not self.verify_result_id(result_id):
+            return None
+        return self.backend.get(f"pdf:{result_id.split('.')[0]}")
+
+def create_result_store(backend=RESULT_STORE_BACKEND, secret=RESULT_STORE_SECRET):
+    """Build the configured result store, falling back to memory on errors"""
+    if backend == 'shm':
+        cache = get_shared_cache()
+        if cache is None:
+            logger.warning("RESULT_STORE_BACKEND=shm requires SHARED_CACHE_PATH, using memory")
+        elif not secret:
+            # Cache entries can be evicted, so the secret can't live there like it does in SQLite
+            logger.error("RESULT_STORE_BACKEND=shm requires RESULT_STORE_SECRET so every worker "
+                         "can verify result IDs, using memory")
+        else:
+            return ResultStore(SharedCacheBackend(cache), secret)
+    if backend == 'sqlite':
+        try:
+            sqlite_backend = SQLiteBackend()
+            return ResultStore(sqlite_backend, secret or sqlite_backend.shared_secret())
+        except sqlite3.Error as e:
+            logger.warning("Failed to open SQLite result store, using memory: %s", e)
+    return ResultStore(MemoryBackend(), secret)
+
+result_store = create_result_store()
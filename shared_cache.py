@@ -0,0 +1,154 @@
+"""
+Host-wide cache shared by every worker process through a memory-mapped file.
+
+The file holds a fixed-size hash table: a small header followed by
+SHARED_CACHE_SLOTS slots of SHARED_CACHE_SLOT_SIZE bytes. Keys hash to a
+group of PROBE_GROUP consecutive slots, and each group is guarded by one of
+LOCK_STRIPES striped locks (a thread lock inside the process plus an fcntl
+byte-range lock across processes), so workers only contend when they touch
+the same stripe. Entries that do not fit in a slot are simply not cached.
+"""
+import contextlib
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+# Shared cache configuration (disabled unless a path is set)
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH')
+SHARED_CACHE_SLOTS = int(os.getenv('SHARED_CACHE_SLOTS', '4096'))
+SHARED_CACHE_SLOT_SIZE = int(os.getenv('SHARED_CACHE_SLOT_SIZE', '16384'))
+SHARED_CACHE_TTL = int(os.getenv('SHARED_CACHE_TTL', '86400'))
+
+MAGIC = b'TAXCACHE'
+HEADER = struct.Struct('<8sII')        # magic, slot count, slot size
+HEADER_SIZE = 64
+SLOT_HEADER = struct.Struct('<16sdI')  # key hash, expiry (epoch seconds), value length
+PROBE_GROUP = 8
+LOCK_STRIPES = 64
+
+logger = logging.getLogger(__name__)
+
+def default_cache_path():
+    """Prefer tmpfs so the mapping never touches disk"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'ai_tax_agent.cache')
+
+class SharedMemoryCache:
+    """Fixed-size, striped-lock hash table in a memory-mapped file"""
+
+    def __init__(self, path, slot_count=SHARED_CACHE_SLOTS, slot_size=SHARED_CACHE_SLOT_SIZE,
+                 ttl=SHARED_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+        slot_count = max(PROBE_GROUP, slot_count - slot_count % PROBE_GROUP)
+        self._init_file(slot_count, slot_size)
+        self._map = mmap.mmap(self._fd, HEADER_SIZE + self.slot_count * self.slot_size)
+        self.max_value_size = self.slot_size - SLOT_HEADER.size
+
+    def _init_file(self, slot_count, slot_size):
+        # The first worker to get here sizes the file; later workers adopt its layout
+        self._lock_range(0, 1, exclusive=True)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            if len(header) == HEADER.size and header[:8] == MAGIC:
+                _, self.slot_count, self.slot_size = HEADER.unpack(header)
+            else:
+                self.slot_count, self.slot_size = slot_count, slot_size
+                os.ftruncate(self._fd, HEADER_SIZE + slot_count * slot_size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, slot_count, slot_size), 0)
+        finally:
+            self._unlock_range(0, 1)
+
+    def _lock_range(self, start, length, exclusive):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, length, start)
+
+    def _unlock_range(self, start, length):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+
+    def _locate(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        group = int.from_bytes(digest[:8], 'little') % (self.slot_count // PROBE_GROUP)
+        return digest, group, group % LOCK_STRIPES
+
+    def _slot_offset(self, group, probe):
+        return HEADER_SIZE + (group * PROBE_GROUP + probe) * self.slot_size
+
+    @contextlib.contextmanager
+    def _locked(self, stripe, exclusive):
+        # fcntl locks don't exclude threads of the same process, hence the thread lock
+        with self._thread_locks[stripe]:
+            # Stripe lock bytes live in the header, one byte per stripe
+            self._lock_range(1 + stripe, 1, exclusive)
+            try:
+                yield
+            finally:
+                self._unlock_range(1 + stripe, 1)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        digest, group, stripe = self._locate(key)
+        now = time.time()
+        with self._locked(stripe, exclusive=False):
+            for probe in range(PROBE_GROUP):
+                offset = self._slot_offset(group, probe)
+                slot_hash, expires, length = SLOT_HEADER.unpack_from(self._map, offset)
+                if slot_hash == digest:
+                    if expires < now:
+                        return None
+                    start = offset + SLOT_HEADER.size
+                    return bytes(self._map[start:start + length])
+        return None
+
+    def set(self, key, value, ttl=None):
+        """Store bytes under key; returns False when the value is too large to cache"""
+        if len(value) > self.max_value_size:
+            return False
+        digest, group, stripe = self._locate(key)
+        now = time.time()
+        with self._locked(stripe, exclusive=True):
+            # Reuse the key's slot, else an empty or expired slot, else evict the soonest to expire
+            target, target_expires = None, None
+            for probe in range(PROBE_GROUP):
+                offset = self._slot_offset(group, probe)
+                slot_hash, expires, _ = SLOT_HEADER.unpack_from(self._map, offset)
+                if slot_hash == digest:
+                    target = offset
+                    break
+                if target_expires is None or expires < target_expires:
+                    target, target_expires = offset, expires
+            # Clear the header first so a crashed writer never leaves a valid-looking partial entry
+            SLOT_HEADER.pack_into(self._map, target, bytes(16), 0.0, 0)
+            self._map[target + SLOT_HEADER.size:target + SLOT_HEADER.size + len(value)] = value
+            SLOT_HEADER.pack_into(self._map, target, digest, now + (ttl or self.ttl), len(value))
+        return True
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    """Process-wide SharedMemoryCache for SHARED_CACHE_PATH, or None when disabled"""
+    global _shared_cache
+    if not SHARED_CACHE_PATH:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            path = default_cache_path() if SHARED_CACHE_PATH == 'auto' else SHARED_CACHE_PATH
+            try:
+                _shared_cache = SharedMemoryCache(path)
+            except OSError as e:
+                logger.warning("Shared cache unavailable at %s: %s", path, e)
+                _shared_cache = False
+    return _shared_cache or None
@@ -9,7 +9,11 @@ import openai
 import json
 import logging
 import re
+import hashlib
+import threading
 from dotenv import load_dotenv
+from shared_cache import get_shared_cache
+from advice_backends import create_advice_backend
 
 # Load environment variables from .env file
 load_dotenv()
@@ -59,6 +63,58 @@ if LLM_ENABLED:
         LLM_ENABLED = False
         openai_client = None
 
+# Structured-output mode: compact prompt, JSON-schema response, adaptive max_tokens
+LLM_STRUCTURED_OUTPUT = os.getenv('LLM_STRUCTURED_OUTPUT', '0') == '1'
+LLM_STRUCTURED_MODEL = os.getenv('LLM_STRUCTURED_MODEL', 'gpt-4o-mini')
+ADVICE_OPPORTUNITIES = int(os.getenv('ADVICE_OPPORTUNITIES', '4'))
+ADVICE_TIPS = int(os.getenv('ADVICE_TIPS', '3'))
+
+STRUCTURED_SYSTEM_PROMPT = "US tax advisor, 2025 IRS rules. Concise, actionable."
+
+ADVICE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'strategy': {'type': 'string', 'enum': ['standard', 'itemize']},
+        'missed_opportunities': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'potential_savings': {'type': 'number'}
+                },
+                'required': ['title', 'description', 'potential_savings'],
+                'additionalProperties': False
+            }
+        },
+        'optimization_tips': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'priority': {'type': 'string', 'enum': ['high', 'medium', 'low']}
+                },
+                'required': ['title', 'description', 'priority'],
+                'additionalProperties': False
+            }
+        },
+        'specific_advice': {'type': 'string'}
+    },
+    'required': ['strategy', 'missed_opportunities', 'optimization_tips', 'specific_advice'],
+    'additionalProperties': False
+}
+
+# Token usage and parse failures of the advice path since startup
+LLM_USAGE = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'parse_failures': 0}
+_llm_usage_lock = threading.Lock()
+
+# Completion backend for advice (real, recorded, replayed or synthetic; see advice_backends)
+advice_backend = create_advice_backend(openai_client)
+LLM_ENABLED = advice_backend is not None
+
 def validate_input(income_str, deductions_str, status, withheld_str=None):
     """
     Comprehensive input validation with security considerations
@@ -130,9 +186,11 @@ def validate_input(income_str, deductions_str, status, withheld_str=None):
         'error': ' '.join(errors) if errors else None
     }
 
-def analyze_deduction_strategy(income, status, itemized_deductions):
+def analyze_deduction_strategy(income, status, itemized_deductions, use_llm=True, llm_advice=None):
     """
-    Provide intelligent analysis of deduction strategy with recommendations
+    Provide intelligent analysis of deduction strategy with recommendations.
+    use_llm=False skips the LLM and serves the rule-based advice (degraded mode);
+    llm_advice passes in advice that was already generated, e.g. by a batch
     """
     standard_deduction = STANDARD_DEDUCTIONS_2025[status]
     
@@ -191,7 +249,8 @@ def analyze_deduction_strategy(income, status, itemized_deductions):
             })
     
     # Get AI-powered advice first (prioritized)
-    llm_advice = get_llm_tax_advice(income, status, itemized_deductions, standard_deduction)
+    if llm_advice is None and use_llm:
+        llm_advice = get_llm_tax_advice(income, status, itemized_deductions, standard_deduction)
     
     if llm_advice:
         # Use AI-generated analysis when available
@@ -214,6 +273,7 @@ def analyze_deduction_strategy(income, status, itemized_deductions):
         # Add AI-specific advice
         if llm_advice.get('specific_advice'):
             analysis['ai_advice'] = llm_advice['specific_advice']
+        analysis['advice_key'] = llm_advice.get('advice_key')
     else:
         # Fallback to traditional analysis when AI is not available
         traditional_opportunities = analyze_missed_deductions(income, status, itemized_deductions)
@@ -222,6 +282,7 @@ def analyze_deduction_strategy(income, status, itemized_deductions):
         analysis['missed_opportunities'] = traditional_opportunities
         analysis['optimization_tips'] = traditional_tips
         analysis['ai_advice'] = None
+        analysis['advice_key'] = None
     
     return analysis
 
@@ -334,22 +395,89 @@ def get_llm_tax_advice(income, status, itemized_deductions, standard_deduction):
     """
     Get personalized tax advice from a large language model (OpenAI GPT)
     """
-    if not LLM_ENABLED or openai_client is None:
+    if not LLM_ENABLED or advice_backend is None:
         return None
     
     try:
-        # Prepare anonymized data for LLM (no personal info, just tax figures)
-        tax_context = {
-            'income_range': get_income_range(income),
-            'filing_status': status,
-            'itemized_deductions': itemized_deductions,
-            'standard_deduction': standard_deduction,
-            'deduction_gap': abs(itemized_deductions - standard_deduction),
-            'year': '2025'
-        }
+        tax_context = build_tax_context(income, status, itemized_deductions, standard_deduction)
+        model, messages, params = build_advice_request(tax_context)
+        
+        # Advice depends only on the anonymized context, so workers on a host can share it
+        advice_cache = get_shared_cache()
+        cache_key = advice_cache_key(dict(tax_context, model=model, structured=LLM_STRUCTURED_OUTPUT))
+        cached_advice = advice_cache.get(cache_key) if advice_cache is not None else None
+        
+        if cached_advice is not None:
+            llm_advice = cached_advice.decode('utf-8')
+        else:
+            # Call the configured advice backend (OpenAI by default)
+            completion = advice_backend.complete(messages, model, **params)
+            record_llm_usage(completion.prompt_tokens, completion.completion_tokens)
+            
+            # Parse the response
+            llm_advice = completion.text
+            if advice_cache is not None:
+                advice_cache.set(cache_key, llm_advice.encode('utf-8'))
         
-        # Create a focused prompt for tax advice
-        prompt = f"""As a tax advisor, provide personalized deduction advice for a {tax_context['filing_status']} filer with:
+        return parse_llm_advice(llm_advice, income, status, cache_key)
+            
+    except Exception as e:
+        logging.warning(f"LLM tax advice failed: {e}")
+        return None
+
+def build_tax_context(income, status, itemized_deductions, standard_deduction):
+    """Anonymized data for the LLM (no personal info, just tax figures)"""
+    return {
+        'income_range': get_income_range(income),
+        'filing_status': status,
+        'itemized_deductions': itemized_deductions,
+        'standard_deduction': standard_deduction,
+        'deduction_gap': abs(itemized_deductions - standard_deduction),
+        'year': '2025'
+    }
+
+def parse_llm_advice(llm_advice, income, status, cache_key):
+    """Turn a raw LLM response into the advice format used by analyze_deduction_strategy"""
+    # Calculate marginal rate for this income level
+    marginal_rate = 0.22  # Default
+    for bracket_limit, rate in TAX_BRACKETS_2025[status]:
+        if income <= bracket_limit:
+            marginal_rate = rate
+            break
+    
+    # Try to parse as JSON, fallback to text parsing if needed
+    try:
+        advice_data = json.loads(llm_advice)
+        advice = format_llm_advice(advice_data, income, marginal_rate)
+    except json.JSONDecodeError:
+        # Fallback: parse text response
+        record_llm_usage(parse_failures=1)
+        advice = parse_text_advice(llm_advice, income, marginal_rate)
+    advice['advice_key'] = cache_key
+    return advice
+
+def build_advice_request(tax_context):
+    """
+    Model, messages and completion parameters for an advice request
+    """
+    if LLM_STRUCTURED_OUTPUT:
+        # Compact prompt; the JSON schema carries the output format instead of prose instructions
+        prompt = (f"{json.dumps(compact_advice_facts(tax_context), separators=(',', ':'))}\n"
+                  f"Give {ADVICE_OPPORTUNITIES} missed deductions and {ADVICE_TIPS} tips.")
+        return LLM_STRUCTURED_MODEL, [
+            {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ], {
+            'max_tokens': advice_token_budget(ADVICE_OPPORTUNITIES, ADVICE_TIPS),
+            'temperature': 0.3,
+            'response_format': {
+                'type': 'json_schema',
+                'json_schema': {'name': 'tax_advice', 'strict': True, 'schema': ADVICE_SCHEMA}
+            }
+        }
+    
+    # Create a focused prompt for tax advice
+    prompt = f"""As a tax advisor, provide personalized deduction advice for a {tax_context['filing_status']} filer with:
 
 Income Range: {tax_context['income_range']}
 Current Itemized Deductions: ${tax_context['itemized_deductions']:,}
@@ -365,41 +493,45 @@ Please provide:
 Focus on practical, actionable advice. Use 2025 tax rules. Be concise but specific.
 Format as JSON with keys: strategy, missed_opportunities, optimization_tips, specific_advice."""
 
-        # Call OpenAI API using the client instance
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are a professional tax advisor providing accurate, practical tax advice based on 2025 IRS rules. Always recommend consulting a qualified tax professional for complex situations."
-                },
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=800,
-            temperature=0.3  # Lower temperature for more consistent advice
-        )
-        
-        # Parse the response
-        llm_advice = response.choices[0].message.content
-        
-        # Calculate marginal rate for this income level
-        marginal_rate = 0.22  # Default
-        for bracket_limit, rate in TAX_BRACKETS_2025[status]:
-            if income <= bracket_limit:
-                marginal_rate = rate
-                break
-        
-        # Try to parse as JSON, fallback to text parsing if needed
-        try:
-            advice_data = json.loads(llm_advice)
-            return format_llm_advice(advice_data, income, marginal_rate)
-        except json.JSONDecodeError:
-            # Fallback: parse text response
-            return parse_text_advice(llm_advice, income, marginal_rate)
-            
-    except Exception as e:
-        logging.warning(f"LLM tax advice failed: {e}")
-        return None
+    return "gpt-3.5-turbo", [
+        {
+            "role": "system", 
+            "content": "You are a professional tax advisor providing accurate, practical tax advice based on 2025 IRS rules. Always recommend consulting a qualified tax professional for complex situations."
+        },
+        {"role": "user", "content": prompt}
+    ], {
+        'max_tokens': 800,
+        'temperature': 0.3  # Lower temperature for more consistent advice
+    }
+
+def compact_advice_facts(tax_context):
+    """The fields of a tax context that matter to the structured-output prompt"""
+    return {
+        'status': tax_context['filing_status'],
+        'income': tax_context['income_range'],
+        'itemized': tax_context['itemized_deductions'],
+        'standard': tax_context['standard_deduction']
+    }
+
+def advice_token_budget(opportunities, tips):
+    """Completion token budget sized to the number of items requested"""
+    return 80 + 75 * opportunities + 45 * tips
+
+def record_llm_usage(prompt_tokens=0, completion_tokens=0, parse_failures=0):
+    """Accumulate token usage and parse failures for the advice path"""
+    with _llm_usage_lock:
+        if prompt_tokens or completion_tokens:
+            LLM_USAGE['calls'] += 1
+        LLM_USAGE['prompt_tokens'] += prompt_tokens or 0
+        LLM_USAGE['completion_tokens'] += completion_tokens or 0
+        LLM_USAGE['parse_failures'] += parse_failures
+    if prompt_tokens or completion_tokens:
+        logging.debug("LLM advice used %s prompt + %s completion tokens", prompt_tokens, completion_tokens)
+
+def advice_cache_key(tax_context):
+    """Cache key for LLM advice generated from an anonymized tax context"""
+    encoded = json.dumps(tax_context, sort_keys=True).encode('utf-8')
+    return 'advice:' + hashlib.sha256(encoded).hexdigest()
 
 def get_income_range(income):
     """Convert specific income to general range for privacy"""
@@ -609,10 +741,23 @@ def parse_text_advice(text_advice, income=0, marginal_rate=0.22):
         'specific_advice': text_advice[:200] + "..." if len(text_advice) > 200 else text_advice
     }
 
-def calculate_tax(income, status, deductions, withheld=0):
+def calculate_tax(income, status, deductions, withheld=0, use_llm=True, llm_advice=None):
     """
     Calculate tax using progressive tax brackets with detailed breakdown
     """
+    result = compute_tax_figures(income, status, deductions, withheld)
+    
+    # Perform smart deduction analysis
+    result['deduction_analysis'] = analyze_deduction_strategy(
+        income, status, deductions, use_llm=use_llm, llm_advice=llm_advice
+    )
+    
+    return result
+
+def compute_tax_figures(income, status, deductions, withheld=0):
+    """
+    Bracket math for calculate_tax without the (LLM-backed) deduction analysis
+    """
     # Use standard deduction if user deduction is less
     standard_deduction = STANDARD_DEDUCTIONS_2025[status]
     actual_deductions = max(deductions, standard_deduction)
@@ -657,9 +802,6 @@ def calculate_tax(income, status, deductions, withheld=0):
     # Calculate refund or additional tax owed
     refund_or_owed = withheld - tax_owed
     
-    # Perform smart deduction analysis
-    deduction_analysis = analyze_deduction_strategy(income, status, deductions)
-    
     return {
         'taxable_income': round(taxable_income),
         'tax_owed': round(tax_owed),
@@ -673,8 +815,7 @@ def calculate_tax(income, status, deductions, withheld=0):
         'federal_withheld': round(withheld),
         'refund_or_owed': round(refund_or_owed),
         'is_refund': refund_or_owed > 0,
-        'net_payment': round(abs(refund_or_owed)),
-        'deduction_analysis': deduction_analysis
+        'net_payment': round(abs(refund_or_owed))
     }
 
 def generate_tax_form_content(data):
@@ -0,0 +1,116 @@
+"""
+Compiled bracket schedules with vectorized forward and inverse tax functions.
+
+Each schedule in TAX_BRACKETS_2025 is piecewise linear, so it is compiled
+once into segment lower bounds, rates and the tax owed at each lower bound.
+The forward function and the closed-form inverse solvers locate the segment
+with a binary search (O(log brackets)) and work on scalars or NumPy arrays.
+"""
+import numpy as np
+
+from tax_calculator import TAX_BRACKETS_2025, STANDARD_DEDUCTIONS_2025
+
+def compile_schedule(brackets):
+    """Segment lower bounds, rates and cumulative tax at each lower bound"""
+    lowers, rates, bases = [], [], []
+    lower = base = 0.0
+    for limit, rate in brackets:
+        lowers.append(lower)
+        rates.append(rate)
+        bases.append(base)
+        base += (limit - lower) * rate
+        lower = limit
+    lowers = np.array(lowers)
+    rates = np.array(rates)
+    bases = np.array(bases)
+    return {
+        'lowers': lowers,
+        'rates': rates,
+        'bases': bases,
+        # After-tax amount at each lower bound, for inverting y - tax(y)
+        'net_bases': lowers - bases
+    }
+
+SCHEDULES_2025 = {status: compile_schedule(brackets) for status, brackets in TAX_BRACKETS_2025.items()}
+
+def _apply(status, fn, *arrays, schedules=SCHEDULES_2025):
+    """Run fn(schedule, status, *arrays) per filing status, preserving scalar inputs"""
+    arrays = np.broadcast_arrays(*(np.asarray(a, dtype=float) for a in arrays))
+    statuses = np.asarray(status)
+    if statuses.ndim == 0:
+        if str(statuses) not in schedules:
+            raise ValueError(f"Unknown filing status: {status}")
+        result = fn(schedules[str(statuses)], str(statuses), *arrays)
+    else:
+        shape = np.broadcast_shapes(statuses.shape, arrays[0].shape)
+        statuses = np.broadcast_to(statuses, shape)
+        arrays = [np.broadcast_to(a, shape) for a in arrays]
+        result = np.full(shape, np.nan)
+        matched = 0
+        for filing_status, schedule in schedules.items():
+            mask = statuses == filing_status
+            if mask.any():
+                result[mask] = fn(schedule, filing_status, *(a[mask] for a in arrays))
+                matched += np.count_nonzero(mask)
+        if matched != statuses.size:
+            raise ValueError("Unknown filing status in batch")
+    return result.item() if np.ndim(result) == 0 else result
+
+def _segment(breakpoints, values):
+    return np.maximum(np.searchsorted(breakpoints, values, side='right') - 1, 0)
+
+def _tax(schedule, status, taxable):
+    taxable = np.maximum(taxable, 0.0)
+    k = _segment(schedule['lowers'], taxable)
+    return schedule['bases'][k] + (taxable - schedule['lowers'][k]) * schedule['rates'][k]
+
+def _taxable_for_tax(schedule, status, tax):
+    k = _segment(schedule['bases'], tax)
+    return np.where(tax >= 0, schedule['lowers'][k] + (tax - schedule['bases'][k]) / schedule['rates'][k], np.nan)
+
+def _gross_for_net(schedule, status, net, deductions):
+    deductions = np.maximum(deductions, STANDARD_DEDUCTIONS_2025[status])
+    # Above the deduction, net = deductions + y - tax(y) with y = taxable income
+    y_net = net - deductions
+    k = _segment(schedule['net_bases'], y_net)
+    y = schedule['lowers'][k] + (y_net - schedule['net_bases'][k]) / (1 - schedule['rates'][k])
+    return np.where(y_net <= 0, net, deductions + y)
+
+def _income_for_refund(schedule, status, target_refund, withheld, deductions):
+    deductions = np.maximum(deductions, STANDARD_DEDUCTIONS_2025[status])
+    return deductions + _taxable_for_tax(schedule, status, withheld - target_refund)
+
+def _withholding(schedule, status, income, deductions, target_refund):
+    deductions = np.maximum(deductions, STANDARD_DEDUCTIONS_2025[status])
+    return _tax(schedule, status, income - deductions) + target_refund
+
+def tax_on_taxable(taxable_income, status, schedules=SCHEDULES_2025):
+    """Tax owed on taxable income (scalar or array); schedules maps status to compile_schedule output"""
+    return _apply(status, _tax, taxable_income, schedules=schedules)
+
+def solve_taxable_for_tax(tax, status):
+    """Taxable income that produces exactly the given tax (NaN for negative tax)"""
+    return _apply(status, _taxable_for_tax, tax)
+
+def solve_gross_for_net(net_income, status, deductions=0):
+    """Gross income whose after-tax income equals net_income (gross-up)"""
+    return _apply(status, _gross_for_net, net_income, deductions)
+
+def solve_income_for_refund(target_refund, withheld, status, deductions=0):
+    """
+    Highest gross income that still yields target_refund for the given
+    withholding (NaN when the target exceeds the withholding)
+    """
+    return _apply(status, _income_for_refund, target_refund, withheld, deductions)
+
+def solve_required_withholding(income, status, deductions=0, target_refund=0):
+    """Federal withholding needed to land on target_refund (0 = break even)"""
+    return _apply(status, _withholding, income, deductions, target_refund)
+
+# Solvers exposed through /api/solve: name -> (function, required fields, optional fields)
+SOLVERS = {
+    'gross_for_net': (solve_gross_for_net, ('net_income',), ('deductions',)),
+    'taxable_for_tax': (solve_taxable_for_tax, ('tax',), ()),
+    'income_for_refund': (solve_income_for_refund, ('target_refund', 'withheld'), ('deductions',)),
+    'required_withholding': (solve_required_withholding, ('income',), ('deductions', 'target_refund'))
+}
@@ -0,0 +1,106 @@
+"""
+Vectorized per-pay-period withholding and estimated-payment schedules.
+
+Year-to-date income plus the expected pay for the remaining periods (or,
+without an expected pay, year-to-date income annualized over the pay
+frequency) is run through the compiled bracket schedule, and the remaining tax is spread over the
+remaining periods so each employee lands near zero owed. Every employee in
+a payroll run is handled in one NumPy pass.
+"""
+import csv
+import io
+
+import numpy as np
+
+from tax_calculator import STANDARD_DEDUCTIONS_2025
+from tax_schedule import tax_on_taxable
+
+# Common pay frequencies (periods per year)
+PAY_FREQUENCIES = {
+    'weekly': 52,
+    'biweekly': 26,
+    'semimonthly': 24,
+    'monthly': 12,
+    'quarterly': 4  # Estimated tax payments
+}
+
+def generate_withholding_schedule(ytd_income, ytd_withheld, status, periods_elapsed,
+                                  periods_per_year=26, deductions=0, target_refund=0, pay_per_period=None):
+    """
+    Per-period withholding plan for one or many employees.
+
+    pay_per_period is the expected gross pay for each remaining period; NaN
+    (or None) falls back to annualizing year-to-date income, which needs at
+    least one elapsed period. All arguments broadcast against each other.
+    Amounts are in dollars;
+    per-period amounts are rounded down to the cent with the leftover
+    cents collected in the final period, so the remaining periods sum to
+    exactly remaining_withholding.
+    """
+    ytd_income = np.asarray(ytd_income, dtype=float)
+    ytd_withheld = np.asarray(ytd_withheld, dtype=float)
+    periods_elapsed = np.asarray(periods_elapsed, dtype=np.int64)
+    periods_per_year = np.asarray(periods_per_year, dtype=np.int64)
+    pay_per_period = np.asarray(np.nan if pay_per_period is None else pay_per_period, dtype=float)
+    if np.any(periods_elapsed < 0) or np.any(periods_elapsed > periods_per_year) or np.any(periods_per_year <= 0):
+        raise ValueError("periods_elapsed must be between 0 and periods_per_year")
+    if np.any(pay_per_period < 0):
+        raise ValueError("pay_per_period must not be negative")
+
+    shape = np.broadcast_shapes(ytd_income.shape, ytd_withheld.shape, np.shape(status),
+                                periods_elapsed.shape, periods_per_year.shape,
+                                np.shape(deductions), np.shape(target_refund), pay_per_period.shape)
+    has_pay = ~np.isnan(pay_per_period)
+    if np.any(np.broadcast_to((periods_elapsed == 0) & ~has_pay, shape)):
+        raise ValueError("pay_per_period is required when no pay periods have elapsed")
+    statuses = np.broadcast_to(np.asarray(status), shape)
+    standard = np.full(shape, np.nan)
+    for filing_status, amount in STANDARD_DEDUCTIONS_2025.items():
+        standard[statuses == filing_status] = amount
+    if np.isnan(standard).any():
+        raise ValueError("Unknown filing status in withholding request")
+
+    # Year-to-date income plus expected pay, else year-to-date income annualized
+    remaining_periods = periods_per_year - periods_elapsed
+    annualized = ytd_income * periods_per_year / np.maximum(periods_elapsed, 1)
+    projected_income = np.where(has_pay, ytd_income + np.nan_to_num(pay_per_period) * remaining_periods, annualized)
+    taxable = np.maximum(projected_income - np.maximum(deductions, standard), 0)
+    projected_tax = tax_on_taxable(taxable, statuses)
+
+    remaining_cents = np.round(np.maximum(projected_tax + target_refund - ytd_withheld, 0) * 100).astype(np.int64)
+    remaining_cents = np.where(remaining_periods > 0, remaining_cents, 0)
+    per_period_cents = remaining_cents // np.maximum(remaining_periods, 1)
+    final_period_cents = remaining_cents - per_period_cents * np.maximum(remaining_periods - 1, 0)
+
+    return {
+        'projected_income': np.round(projected_income, 2),
+        'projected_tax': np.round(projected_tax, 2),
+        'remaining_periods': remaining_periods,
+        'remaining_withholding': remaining_cents / 100,
+        'per_period_withholding': np.where(remaining_periods > 0, per_period_cents, 0) / 100,
+        'final_period_withholding': np.where(remaining_periods > 0, final_period_cents, 0) / 100,
+        # Positive when withholding already exceeds the projected liability
+        'projected_overpayment': np.round(np.maximum(ytd_withheld - projected_tax - target_refund, 0), 2)
+    }
+
+def schedule_to_rows(schedule, employee_ids=None):
+    """Flatten a schedule into one dict per employee"""
+    columns = {key: np.atleast_1d(values) for key, values in schedule.items()}
+    count = max(len(values) for values in columns.values())
+    columns = {key: np.broadcast_to(values, (count,)) for key, values in columns.items()}
+    if employee_ids is None:
+        employee_ids = range(count)
+    return [
+        dict({'employee_id': employee_id}, **{key: values[i].item() for key, values in columns.items()})
+        for i, employee_id in enumerate(employee_ids)
+    ]
+
+def schedule_to_csv(rows):
+    """Render schedule rows as CSV text"""
+    if not rows:
+        return ''
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()